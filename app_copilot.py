@@ -1,30 +1,39 @@
 from dotenv import load_dotenv
 import streamlit as st
 import os
-import time
-
-# Langchain e integração
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_core.documents import Document
-from langchain_groq import ChatGroq
 
 # === Carregar chaves ===
+# Antes dos módulos locais: metricas e outros leem as variáveis na importação
 load_dotenv(dotenv_path="Chatbot_Wiki/.env")
 
-groq_api_key = os.getenv("groq_api_key") or st.secrets.get("groq_api_key")
-google_api_key = os.getenv("google_api_key") or st.secrets.get("google_api_key")
+# LangChain, FAISS e os clientes dos modelos são importados sob demanda
+# (recursos.py e responder), não a cada execução do script
+import metricas
+import recursos
+from recursos import AQUECIMENTO
+
+# Painel de métricas na barra lateral, para quem administra o chat
+PAINEL_METRICAS = os.getenv("PAINEL_METRICAS") == "1"
+
+def ler_chave(nome):
+    try:
+        return os.getenv(nome) or st.secrets.get(nome)
+    except FileNotFoundError:
+        # Sem secrets.toml (execução local): vale só o .env
+        return None
+
+
+groq_api_key = ler_chave("groq_api_key")
+# Mesmo padrão de backends_embedding.BACKEND_EMBEDDING, sem importar o módulo
+# O backend local não usa a chave da Google
+usa_google = os.getenv("BACKEND_EMBEDDING", "google") == "google"
+google_api_key = ler_chave("google_api_key") if usa_google else None
 
 if not groq_api_key:
     st.error("⚠️ Chave da Groq não encontrada.")
     st.stop()
 
-if not google_api_key:
+if usa_google and not google_api_key:
     st.error("⚠️ Chave da Google API não encontrada.")
     st.stop()
 
@@ -70,145 +79,255 @@ st.image("wiki.png", width=220)
 st.title("Chat Documenta Wiki")
 st.caption("Tire dúvidas sobre a ferramenta de documentação oficial do MDS")
 
-# === LLM ===
-llm = ChatGroq(groq_api_key=groq_api_key, model_name="Llama3-8b-8192")
-
-# === Prompt com protocolo de nomeação integrado ===
-# === Prompt com protocolo de nomeação integrado ===
-prompt = ChatPromptTemplate.from_template("""
-Você é um assistente especializado na Documenta Wiki, ferramenta oficial do Ministério do Desenvolvimento e Assistência Social, Família e Combate à Fome (MDS), utilizada para documentar programas, ações, sistemas e indicadores.
-
-Baseie sua resposta no contexto fornecido abaixo. Dê respostas completas, expandindo a explicação com base no conteúdo conhecido sobre a plataforma. Responda sempre em linguagem acessível, porém formal.
-
-⚠️ Diferencie claramente:
-- Quando a pergunta for sobre **como solicitar acesso para editar**, responda com o procedimento institucional (envio de e-mail ao DMA). Traga o prazo que o DMA tem para responder.
-- Quando for sobre **como editar uma ficha**, apresente o passo a passo das instruções da interface.
-- Quando for sobre **quem pode criar uma ficha de programa**, informe que para criar uma nova ficha de programa é preciso enviar solicitação ao DMA por e-mail. A ficha será criada após envio completo das informações.
-- Quando for sobre **quem pode criar uma ficha de indicador**, informe que deve ser enviada solicitação ao DMA por e-mail. A ficha será criada após envio completo das informações em até 48 horas.
-- Quando for sobre **quem pode publicar uma ficha**, diferencie claramente:
-  - A **ficha de programa só pode ser publicada após análise e autorização prévia do DMA**, mesmo que tenha sido completamente preenchida pela área responsável.
-  - A **ficha de indicador pode ser publicada diretamente pela área responsável**, **sem necessidade de autorização do DMA**, desde que esteja completamente preenchida conforme as orientações da plataforma. Essa autonomia visa dar mais dinamismo à documentação e reconhece o protagonismo técnico da área que gerencia o programa.
+# === Recursos compartilhados ===
+# Modelos, cadeias e índice são criados uma única vez por processo (ver
+# recursos.py), em uma thread de aquecimento disparada na primeira sessão.
+# As execuções seguintes do script só leem o estado já pronto.
+@st.cache_resource(show_spinner=False)
+def iniciar_metricas():
+    # Um único endpoint /metrics por processo (se METRICAS_PORTA estiver definida)
+    return metricas.iniciar_servidor()
 
-Se a pergunta solicitar **uma ficha de indicador preenchida**, use o documento base da ficha como referência. Avalie a orientação para preenchimento de cada campo contido no material e **solicite que o usuário forneça as informações mínimas necessárias para o preenchimento dos campos**. Tente, a partir do contexto dado, propor os campos de cada ficha. Para propor o nome do indicador, **utilize as regras do protocolo de nomeação**: tipo de medida + unidade + população-alvo + recorte geográfico ou temporal, se necessário. Destaque que o nome deve ser validado em conjunto com o DMA.
 
-Se a pergunta envolver **como preencher um determinado campo da ficha do indicador**, descreva o que deve conter no campo questionado e sugira exemplos de resposta.
+iniciar_metricas()
+AQUECIMENTO.iniciar(groq_api_key, google_api_key)
+aviso_aquecimento = st.empty()
 
-Se a pergunta envolver **propor uma ficha de programa preenchida**, destaque que é necessário o envio de **referências legais e informações técnicas** sobre o programa. Avalie a orientação para preenchimento de cada campo contido no material de referência.
 
-🔎 Importante: Ao propor qualquer ficha preenchida, **informe que a proposta pode conter erros**, devendo ser revisada com atenção pelo ponto focal antes de ser transportada para a Documenta Wiki.
-
-Se a pergunta for sobre conteúdos que mudam frequentemente (como lista de programas), oriente o usuário a acessar a Documenta Wiki pelo link oficial: mds.gov.br/documenta-wiki. Entretanto, explique a organização básica da ferramenta, com a apresentação dos programas atualmente vigentes e os programas descontinuados. Que ao acessar a página de cada programa é possível acessar a lista de indicadores documentados e outros conteúdos relacionados ao programa.
-
-Nunca cite os nomes dos documentos utilizados como referência ao responder.
-
-Sempre no final de cada interação, use frases motivacionais sobre a importância da documentação e da completude do preenchimento das fichas, variando a cada interação.
-
-<contexto>
-{context}
-</contexto>
-
-Pergunta:
-{input}
-""")
-
-# === Função de vetorização ===
-def vector_embedding():
-    if "vectors" in st.session_state:
-        return
-
-    try:
-        st.session_state.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=google_api_key
-        )
-    except Exception as e:
-        st.error(f"❌ Erro ao inicializar embeddings: {e}")
-        st.stop()
-
-    pdf_paths = [
-        "Manual_de_Uso_Documenta_Wiki_MDS_SAGICAD.pdf",
-        "Roteiro_video_divulgacao.pdf",
-        "Roteiro_Tutorial_Documenta_Wiki.pdf",
-        "Ficha de Indicador.pdf",
-        "Ficha de Programa.pdf",
-        "Protocolo_nomeacao_indicadores.pdf"
-    ]
-
-    docs = []
-    for path in pdf_paths:
-        if os.path.exists(path):
-            loader = PyPDFLoader(path)
-            docs.extend(loader.load())
+def mostrar_aquecimento():
+    if AQUECIMENTO.estado == "erro":
+        aviso_aquecimento.error(f"❌ Falha ao carregar a base de conhecimento: {AQUECIMENTO.erro}")
+    elif AQUECIMENTO.estado != "pronto":
+        aviso_aquecimento.info(f"⏳ Preparando a base de conhecimento ({AQUECIMENTO.passo})...")
+    else:
+        aviso_aquecimento.empty()
+
+
+mostrar_aquecimento()
+for aviso in AQUECIMENTO.avisos:
+    st.warning(f"⚠️ {aviso}")
+
+# === Conversa ===
+# Cada sessão guarda o histórico limitado usado nos prompts (Conversa) e as
+# mensagens exibidas na tela
+if "mensagens" not in st.session_state:
+    st.session_state.conversa = None  # criada na primeira pergunta
+    st.session_state.mensagens = []
+
+
+def mostrar_trechos(contexto):
+    with st.expander("📄 Trechos usados da base de conhecimento"):
+        for doc in contexto:
+            st.markdown(f"""
+                <div style="background-color:#f0f0f0; padding:10px; margin:5px; border-left: 4px solid #888;">
+                    <p>{doc.page_content}</p>
+                </div>
+            """, unsafe_allow_html=True)
+
+
+def responder_ficha(intencao, consulta, base, tempos):
+    """Rascunho de ficha: grupos de campos gerados em paralelo, exibidos na ordem da ficha."""
+    from rascunho_ficha import AVISO, FICHAS, SEM_MODELO, campos_da_ficha, gerar_ficha, grupos_da_ficha, montar_ficha
+    from resposta import formatar_tempos
+
+    # Sem modelo legível não há de onde tirar os campos: o rascunho é recusado
+    if not campos_da_ficha(intencao):
+        aviso = SEM_MODELO.format(nome=FICHAS[intencao].nome)
+        st.warning(aviso)
+        return aviso, [], ""
+
+    grupos = grupos_da_ficha(intencao)
+    st.markdown(f"## Proposta de {FICHAS[intencao].nome}")
+    caixas = [st.empty() for _ in grupos]
+    for caixa, grupo in zip(caixas, grupos):
+        caixa.caption(f"⏳ {'; '.join(grupo.campos)}")
+    st.caption(AVISO)
+
+    llm, _ = recursos.llms(groq_api_key)
+    secoes, contexto = [None] * len(grupos), []
+    for i, secao, docs in gerar_ficha(intencao, consulta, llm, base.vectors, base.bm25, tempos):
+        secoes[i] = secao
+        caixas[i].markdown(secao)
+        contexto += [doc for doc in docs if doc not in contexto]
+    legenda = formatar_tempos(tempos)
+    st.caption(legenda)
+    return montar_ficha(intencao, secoes), contexto, legenda
+
+
+def responder(pergunta, tempos):
+    """Gera a resposta na tela e retorna (pergunta considerada, resposta, contexto, legenda, é rascunho de ficha)."""
+    from contexto import K_CANDIDATOS
+    from conversa import Conversa
+    from rascunho_ficha import FICHAS
+    from recuperacao import MODO_BUSCA, RetrieverHibrido, VetorConsulta
+    from resposta import (
+        buscar_em_cache, concluir, formatar_tempos, gerar_em_stream, recuperar, reescrever, selecionar_contexto
+    )
+    from roteador import classificar, fontes_da_intencao
+
+    _, llm_auxiliar = recursos.llms(groq_api_key)
+    if st.session_state.conversa is None:
+        st.session_state.conversa = Conversa()
+
+    # Perguntas de continuação viram perguntas independentes antes da busca
+    consulta = reescrever(st.session_state.conversa, pergunta, llm_auxiliar, tempos)
+    if consulta != pergunta:
+        st.caption(f"🔁 Pergunta considerada: {consulta}")
+
+    base = recursos.base(google_api_key)
+    # O assunto da pergunta define um prompt curto e os PDFs da busca
+    intencao = classificar(consulta)
+    if intencao in FICHAS:
+        # Rascunhos dependem dos dados de cada pedido: não passam pelo cache de respostas
+        return (consulta, *responder_ficha(intencao, consulta, base, tempos), True)
+
+    cache_respostas = recursos.cache_respostas(google_api_key)
+    # Um único embedding da pergunta, com tempo limite, para o cache e a busca;
+    # ele só é pedido se o texto exato da pergunta não estiver no cache
+    vetor_consulta = VetorConsulta(base.vectors.embeddings, consulta) if MODO_BUSCA != "lexical" else None
+    em_cache = buscar_em_cache(cache_respostas, consulta, base.versao, tempos, vetor_consulta)
+    if em_cache is not None:
+        st.markdown(f"<div class='chat-box'>{em_cache['resposta']}</div>", unsafe_allow_html=True)
+        concluir(tempos)
+        legenda = f"⚡ Resposta em cache: {tempos['total'] * 1000:.0f} ms"
+        st.caption(legenda)
+        return consulta, em_cache["resposta"], em_cache["contexto"], legenda, False
+
+    document_chain = recursos.cadeia(groq_api_key, intencao)
+    # Mais candidatos que o necessário: o montador de contexto une,
+    # diversifica e corta no orçamento de tokens
+    retriever = RetrieverHibrido(
+        vectors=base.vectors, bm25=base.bm25,
+        modo=MODO_BUSCA, fontes=fontes_da_intencao(intencao), k=K_CANDIDATOS, vetor_consulta=vetor_consulta
+    )
+
+    with st.spinner("🔎 Buscando trechos na base de conhecimento..."):
+        contexto = selecionar_contexto(recuperar(retriever, consulta, tempos), tempos)
+
+    # A resposta é exibida à medida que os tokens chegam do modelo
+    caixa = st.empty()
+    resposta = ""
+    for parte in gerar_em_stream(document_chain, consulta, contexto, tempos):
+        resposta += parte
+        caixa.markdown(f"<div class='chat-box'>{resposta}▌</div>", unsafe_allow_html=True)
+    caixa.markdown(f"<div class='chat-box'>{resposta}</div>", unsafe_allow_html=True)
+    legenda = formatar_tempos(tempos)
+    st.caption(legenda)
+
+    cache_respostas.gravar(consulta, base.versao, resposta, contexto, vetor_consulta)
+    return consulta, resposta, contexto, legenda, False
+
+
+def mostrar_metricas():
+    resumo = metricas.resumo()
+    with st.sidebar:
+        st.subheader("📊 Métricas do pipeline")
+        if not resumo["etapas"]:
+            st.caption("Nenhuma etapa medida ainda.")
+            return
+        linhas = [
+            "| Etapa | n | p50 (ms) | p95 (ms) | Erros | Itens | Tokens |",
+            "|---|---:|---:|---:|---:|---:|---:|",
+        ]
+        linhas += [
+            f"| {nome} | {dados['n']} | {dados['p50_ms']:.1f} | {dados['p95_ms']:.1f} | "
+            f"{dados['erros']} | {dados['itens']} | {dados['tokens']} |"
+            for nome, dados in sorted(resumo["etapas"].items())
+        ]
+        st.markdown("\n".join(linhas))
+        eventos = resumo["eventos"]
+        for cache in ("cache_respostas", "cache_embeddings"):
+            acertos, faltas = eventos.get(f"{cache}_acerto", 0), eventos.get(f"{cache}_falta", 0)
+            if acertos + faltas:
+                st.caption(f"{cache}: {acertos / (acertos + faltas):.0%} de acertos ({acertos + faltas} consultas)")
+        outros = {
+            evento: valor for evento, valor in eventos.items()
+            if not evento.endswith(("_acerto", "_falta"))
+        }
+        if outros:
+            st.json(outros)
+
+
+# === Botões ===
+col_nova, col_recarregar = st.columns(2)
+with col_nova:
+    if st.button("Nova conversa"):
+        st.session_state.conversa = None
+        st.session_state.mensagens = []
+
+
+def mostrar_botao_recarregar():
+    # Um erro no aquecimento não é repetido sozinho a cada execução: só este botão tenta de novo
+    with col_recarregar:
+        if st.button("Tentar carregar a base de novo", key="recarregar_base"):
+            AQUECIMENTO.reiniciar(groq_api_key, google_api_key)
+            mostrar_aquecimento()
+
+
+# O botão só pode ser desenhado uma vez por execução
+botao_recarregar_exibido = AQUECIMENTO.estado == "erro"
+if botao_recarregar_exibido:
+    mostrar_botao_recarregar()
+
+# === Histórico exibido ===
+for mensagem in st.session_state.mensagens:
+    if mensagem["papel"] == "user":
+        with st.chat_message("user"):
+            st.markdown(mensagem["texto"])
+        continue
+    with st.chat_message("assistant", avatar="wiki.png"):
+        if mensagem["consulta"] != mensagem["pergunta"]:
+            st.caption(f"🔁 Pergunta considerada: {mensagem['consulta']}")
+        if mensagem["ficha"]:
+            st.markdown(mensagem["texto"])
         else:
-            st.warning(f"⚠️ Arquivo não encontrado: {path}")
-
-    if not docs:
-        st.error("❌ Nenhum documento foi carregado.")
-        st.stop()
-
-    splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=30)
-    chunks = splitter.split_documents(docs)
-
-    def limpar_texto(txt):
-        return txt.encode("utf-8", "ignore").decode("utf-8").strip()
-
-    chunks = [
-        Document(page_content=limpar_texto(doc.page_content), metadata=doc.metadata)
-        for doc in chunks
-    ]
-
-    try:
-        _ = st.session_state.embeddings.embed_documents(["teste simples"])
-    except Exception as e:
-        st.error(f"❌ Falha ao testar embedding: {e}")
-        st.stop()
-
-    try:
-        st.session_state.vectors = FAISS.from_documents(chunks, st.session_state.embeddings)
-        st.session_state.ready = True
-        st.success("✅ Vetorização concluída com sucesso!")
-    except Exception as e:
-        st.error(f"❌ Falha ao criar índice FAISS: {e}")
-        st.stop()
-
-# === Entrada do usuário ===
-prompt1 = st.text_area(
-    "Digite sua pergunta sobre a Documenta Wiki abaixo:",
-    height=100,
-    placeholder="Ex: Como editar uma ficha de indicador? Ou: Quem pode publicar uma ficha de programa?",
-    key="user_input"
-)
-
-# === Botão de carregamento ===
-if st.button("Carregar base do chat"):
-    with st.spinner("Carregando base de conhecimento..."):
-        vector_embedding()
+            st.markdown(f"<div class='chat-box'>{mensagem['texto']}</div>", unsafe_allow_html=True)
+        st.caption(mensagem["legenda"])
+        mostrar_trechos(mensagem["contexto"])
 
 # === Execução do chat ===
-if prompt1:
-    if "vectors" not in st.session_state:
-        st.warning("⚠️ Clique em 'Carregar base do chat' antes de perguntar.")
+pergunta = st.chat_input("Digite sua pergunta. Ex: Como editar uma ficha de indicador?")
+
+if pergunta:
+    with st.chat_message("user"):
+        st.markdown(pergunta)
+    # Perguntas feitas durante o aquecimento esperam por ele
+    if not AQUECIMENTO.aguardar(0):
+        with st.spinner("Carregando base de conhecimento..."):
+            AQUECIMENTO.aguardar()
+        mostrar_aquecimento()
+    if AQUECIMENTO.estado != "pronto":
+        st.warning("⚠️ A base de conhecimento não pôde ser carregada; tente de novo.")
     else:
-        document_chain = create_stuff_documents_chain(llm, prompt)
-        retriever = st.session_state.vectors.as_retriever()
-        retrieval_chain = create_retrieval_chain(retriever, document_chain)
-
-        with st.spinner("🧠 Gerando resposta..."):
-            start = time.process_time()
-            response = retrieval_chain.invoke({"input": prompt1})
-            elapsed = time.process_time() - start
-
-        st.image("wiki.png", width=120)
-        st.markdown(f"<div class='chat-box'>{response['answer']}</div>", unsafe_allow_html=True)
-        st.caption(f"⏱️ Tempo de resposta: {elapsed:.2f} segundos")
-
-        with st.expander("📄 Trechos usados da base de conhecimento"):
-            for i, doc in enumerate(response.get("context", [])):
-                st.markdown(f"""
-                    <div style="background-color:#f0f0f0; padding:10px; margin:5px; border-left: 4px solid #888;">
-                        <p>{doc.page_content}</p>
-                    </div>
-                """, unsafe_allow_html=True)
-
-        
-
+        with st.chat_message("assistant", avatar="wiki.png"):
+            from resposta import novos_tempos
+
+            # Todas as etapas desta pergunta saem no log com o mesmo rastro
+            metricas.novo_rastro()
+            consulta, resposta, contexto, legenda, ficha = responder(pergunta, novos_tempos())
+            mostrar_trechos(contexto)
+
+        st.session_state.mensagens.append({"papel": "user", "texto": pergunta})
+        st.session_state.mensagens.append({
+            "papel": "assistant", "texto": resposta, "pergunta": pergunta,
+            "consulta": consulta, "contexto": contexto, "legenda": legenda, "ficha": ficha,
+        })
+        # O histórico dos prompts guarda a pergunta já reescrita, que não
+        # depende das anteriores; trocas antigas vão para o resumo
+        st.session_state.conversa.registrar(consulta, resposta, recursos.llms(groq_api_key)[1])
+        metricas.gravar_prometheus()
+
+if PAINEL_METRICAS:
+    mostrar_metricas()
+
+# Enquanto o aquecimento não termina, o aviso do topo acompanha o progresso
+# e a página é atualizada quando tudo estiver pronto; em caso de erro, o
+# aviso e o botão de tentar de novo aparecem sem nova execução
+if AQUECIMENTO.estado == "carregando":
+    while not AQUECIMENTO.aguardar(0.5):
+        mostrar_aquecimento()
+    if AQUECIMENTO.estado == "pronto":
+        st.rerun()
+    mostrar_aquecimento()
+    if not botao_recarregar_exibido:
+        mostrar_botao_recarregar()
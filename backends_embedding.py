@@ -0,0 +1,94 @@
+"""Backends de embedding selecionáveis por implantação.
+
+- "google": models/embedding-001 via API, com o cache local de embeddings.
+- "local": vetores calculados na CPU, sem rede. Cada termo recebe um vetor
+  aleatório fixo (derivado do hash do termo) e o texto é a soma desses
+  vetores ponderada pela frequência sublinear, o que equivale a uma
+  projeção aleatória do TF com hashing. Útil para CI, homologação sem
+  internet ou quando a API estiver indisponível.
+
+O nome do modelo entra no manifesto do índice, então trocar de backend ou
+de dimensão força a reconstrução.
+"""
+import hashlib
+import os
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from recuperacao import tokenizar
+
+BACKEND_EMBEDDING = os.getenv("BACKEND_EMBEDDING", "google")  # google | local
+MODELO_EMBEDDING = "models/embedding-001"
+DIMENSAO_LOCAL = int(os.getenv("EMBEDDING_LOCAL_DIMENSAO", "384"))
+LOTE_LOCAL = int(os.getenv("EMBEDDING_LOCAL_LOTE", "256"))
+
+
+@lru_cache(maxsize=200_000)
+def _vetor_termo(termo, dimensao):
+    # Semente estável entre processos (hash() do Python é aleatorizado)
+    semente = int.from_bytes(hashlib.blake2b(termo.encode("utf-8"), digest_size=8).digest(), "little")
+    vetor = np.random.default_rng(semente).standard_normal(dimensao).astype("float32")
+    return vetor / np.sqrt(dimensao)
+
+
+class EmbeddingsLocais(Embeddings):
+    def __init__(self, dimensao=DIMENSAO_LOCAL, tamanho_lote=LOTE_LOCAL):
+        self.dimensao = dimensao
+        self.tamanho_lote = tamanho_lote
+
+    def _termos(self, texto):
+        tokens = tokenizar(texto)
+        # Bigramas ajudam a distinguir expressões como "ficha de programa"
+        return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+    def _vetorizar_lote(self, textos):
+        contagens = [Counter(self._termos(texto)) for texto in textos]
+        vocabulario = sorted({termo for contagem in contagens for termo in contagem})
+        if not vocabulario:
+            return np.zeros((len(textos), self.dimensao), dtype="float32")
+
+        posicao = {termo: i for i, termo in enumerate(vocabulario)}
+        pesos = np.zeros((len(textos), len(vocabulario)), dtype="float32")
+        for linha, contagem in enumerate(contagens):
+            for termo, tf in contagem.items():
+                pesos[linha, posicao[termo]] = 1.0 + np.log(tf)
+
+        projecao = np.stack([_vetor_termo(termo, self.dimensao) for termo in vocabulario])
+        vetores = pesos @ projecao
+        normas = np.linalg.norm(vetores, axis=1, keepdims=True)
+        return vetores / np.where(normas == 0, 1.0, normas)
+
+    def embed_documents(self, texts):
+        vetores = []
+        for i in range(0, len(texts), self.tamanho_lote):
+            vetores.extend(self._vetorizar_lote(texts[i:i + self.tamanho_lote]).tolist())
+        return vetores
+
+    def embed_query(self, text):
+        return self._vetorizar_lote([text])[0].tolist()
+
+
+def nome_modelo(backend=BACKEND_EMBEDDING):
+    if backend == "local":
+        return f"local-hash-{DIMENSAO_LOCAL}"
+    return MODELO_EMBEDDING
+
+
+def criar_embeddings(backend=BACKEND_EMBEDDING, google_api_key=None, caminho_cache=None):
+    if backend == "local":
+        return EmbeddingsLocais()
+    if backend != "google":
+        raise ValueError(f"Backend de embedding desconhecido: {backend}")
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    from cache_embeddings import EmbeddingsComCache
+
+    # Só os trechos nunca vistos antes são enviados à API de embeddings
+    return EmbeddingsComCache(
+        GoogleGenerativeAIEmbeddings(model=MODELO_EMBEDDING, google_api_key=google_api_key),
+        modelo=MODELO_EMBEDDING,
+        caminho=caminho_cache,
+    )
@@ -0,0 +1,555 @@
+"""Base de conhecimento do Chat Documenta Wiki.
+
+O índice FAISS é construído uma única vez, gravado em disco junto com o
+docstore e um manifesto com o hash de cada PDF de origem, e depois
+carregado somente para leitura por todas as sessões e processos.
+Quando o conteúdo de algum PDF muda, apenas os vetores daquele PDF são
+removidos e reinseridos; o restante do índice é preservado. O BM25 só
+refaz o segmento dos PDFs alterados, mas o índice FAISS é regravado
+inteiro e os demais documentos são copiados para o docstore da nova
+versão: a gravação cresce com o corpus. A construção e a atualização
+gravam os trechos lote a lote, sem juntar o corpus em memória.
+
+Na divisão estrutural (padrão), só os trechos "filho" são vetorizados; as
+seções "pai" ficam no mesmo docstore, sem vetor, e são devolvidas no lugar
+dos filhos na recuperação (ver divisao_estruturada.py).
+
+O tipo do índice (plano, float16, IVF ou IVF-PQ) e o docstore mapeado em
+memória ficam em indice_vetorial.py. O índice BM25 (recuperacao.py) é
+gravado na mesma pasta de cada versão, também para leitura com mmap.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain, groupby
+from operator import itemgetter
+
+try:
+    import fcntl
+except ImportError:  # Windows: o bloqueio entre processos fica desativado
+    fcntl = None
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from backends_embedding import nome_modelo
+from divisao_estruturada import TAMANHO_FILHO, TAMANHO_MAXIMO_PAI, dividir_documento
+from indice_vetorial import (
+    AMOSTRA_TREINO,
+    TIPO_INDICE,
+    EscritorDocstore,
+    ajustar_nprobe,
+    carregar_docstore,
+    criar_index,
+    descricao_para,
+    precisa_treino,
+    proximo_rotulo,
+)
+from metricas import etapa, registrar
+from recuperacao import ConstrutorBM25, IndiceBM25
+
+# === Configuração ===
+PDF_PATHS = [
+    "Manual_de_Uso_Documenta_Wiki_MDS_SAGICAD.pdf",
+    "Roteiro_video_divulgacao.pdf",
+    "Roteiro_Tutorial_Documenta_Wiki.pdf",
+    "Ficha de Indicador.pdf",
+    "Ficha de Programa.pdf",
+    "Protocolo_nomeacao_indicadores.pdf"
+]
+
+ESTRATEGIA_DIVISAO = os.getenv("ESTRATEGIA_DIVISAO", "estrutural")  # estrutural | fixa
+CHUNK_SIZE = 300
+CHUNK_OVERLAP = 30
+# Muda quando os arquivos de cada versão mudam (4: docstore gravado em fluxo)
+FORMATO_INDICE = 4
+
+TRABALHADORES_EXTRACAO = int(os.getenv("TRABALHADORES_EXTRACAO", str(os.cpu_count() or 1)))
+PAGINAS_POR_TAREFA = 2
+
+DIRETORIO_INDICE = os.getenv("DIRETORIO_INDICE", "indice_faiss")
+ARQUIVO_ATUAL = "ATUAL"
+ARQUIVO_MANIFESTO = "manifesto.json"
+ARQUIVO_FAISS = "index.faiss"
+CAMINHO_CACHE_EMBEDDINGS = os.path.join(DIRETORIO_INDICE, "embeddings.sqlite")
+
+_lock_processo = threading.Lock()
+
+
+# === Manifesto ===
+_hashes = {}  # path -> ((mtime_ns, tamanho), sha256)
+
+
+def hash_arquivo(path):
+    """sha256 do arquivo; só é recalculado quando a data de modificação ou o tamanho mudam.
+
+    A versão do índice é conferida a cada pergunta: sem isso, cada pergunta
+    leria todos os PDFs do disco.
+    """
+    info = os.stat(path)
+    assinatura = (info.st_mtime_ns, info.st_size)
+    guardado = _hashes.get(path)
+    if guardado is not None and guardado[0] == assinatura:
+        return guardado[1]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    _hashes[path] = (assinatura, h.hexdigest())
+    return h.hexdigest()
+
+
+def _config_divisao():
+    if ESTRATEGIA_DIVISAO == "estrutural":
+        return {"divisao": "estrutural", "tamanho_filho": TAMANHO_FILHO, "tamanho_maximo_pai": TAMANHO_MAXIMO_PAI}
+    return {"divisao": "fixa", "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+
+
+def calcular_manifesto(pdf_paths=PDF_PATHS, modelo=None):
+    return {
+        "config": {
+            "modelo": modelo or nome_modelo(),
+            "indice": TIPO_INDICE,
+            "formato": FORMATO_INDICE,
+            **_config_divisao(),
+        },
+        "fontes": {
+            path: {"sha256": hash_arquivo(path)}
+            for path in pdf_paths
+            if os.path.exists(path)
+        },
+    }
+
+
+def _assinatura(manifesto):
+    return {
+        "config": manifesto["config"],
+        "fontes": {path: info["sha256"] for path, info in manifesto["fontes"].items()},
+    }
+
+
+def versao_manifesto(manifesto):
+    bruto = json.dumps(_assinatura(manifesto), sort_keys=True).encode("utf-8")
+    return hashlib.sha256(bruto).hexdigest()[:16]
+
+
+def _diretorio_atual(diretorio):
+    try:
+        with open(os.path.join(diretorio, ARQUIVO_ATUAL), encoding="utf-8") as f:
+            versao = f.read().strip()
+    except FileNotFoundError:
+        return None
+    caminho = os.path.join(diretorio, versao)
+    return caminho if os.path.isdir(caminho) else None
+
+
+def ler_manifesto(diretorio=DIRETORIO_INDICE):
+    atual = _diretorio_atual(diretorio)
+    if atual is None:
+        return None
+    with open(os.path.join(atual, ARQUIVO_MANIFESTO), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def indice_atualizado(manifesto, diretorio=DIRETORIO_INDICE):
+    salvo = ler_manifesto(diretorio)
+    return salvo is not None and _assinatura(salvo) == _assinatura(manifesto)
+
+
+def fontes_alteradas(manifesto, salvo):
+    """Retorna (alteradas, removidas) comparando o manifesto atual com o salvo."""
+    anteriores = salvo["fontes"]
+    alteradas = [
+        path for path, info in manifesto["fontes"].items()
+        if anteriores.get(path, {}).get("sha256") != info["sha256"]
+    ]
+    removidas = [path for path in anteriores if path not in manifesto["fontes"]]
+    return alteradas, removidas
+
+
+# === Bloqueio entre processos ===
+@contextmanager
+def _bloqueio(diretorio):
+    os.makedirs(diretorio, exist_ok=True)
+    with _lock_processo, open(os.path.join(diretorio, ".lock"), "w") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# === Ingestão em pipeline ===
+# Extração de páginas em um pool de processos, divisão e limpeza como
+# geradores e vetorização em lotes enquanto a extração ainda está rodando.
+def limpar_texto(txt):
+    return txt.encode("utf-8", "ignore").decode("utf-8").strip()
+
+
+def _extrair_paginas(path, inicio, fim):
+    # Executada nos processos do pool: precisa ser uma função de módulo. O
+    # tempo é medido aqui e registrado no processo principal
+    comeco = time.perf_counter()
+    leitor = PdfReader(path)
+    paginas = [(path, numero, leitor.pages[numero].extract_text()) for numero in range(inicio, fim)]
+    return time.perf_counter() - comeco, paginas
+
+
+def _registrar_extracao(resultado):
+    duracao, paginas = resultado
+    registrar(
+        "extracao", duracao, fonte=paginas[0][0] if paginas else None,
+        itens=len(paginas), bytes=sum(len(texto.encode("utf-8")) for _, _, texto in paginas),
+    )
+    return paginas
+
+
+def _tarefas_extracao(pdf_paths):
+    for path in pdf_paths:
+        total = len(PdfReader(path).pages)
+        for inicio in range(0, total, PAGINAS_POR_TAREFA):
+            yield path, inicio, min(inicio + PAGINAS_POR_TAREFA, total)
+
+
+def extrair_paginas(pdf_paths, trabalhadores=TRABALHADORES_EXTRACAO):
+    tarefas = _tarefas_extracao(pdf_paths)
+    if trabalhadores <= 1:
+        for tarefa in tarefas:
+            yield from _registrar_extracao(_extrair_paginas(*tarefa))
+        return
+
+    # Janela limitada de tarefas em andamento para manter a memória sob controle
+    with ProcessPoolExecutor(max_workers=trabalhadores) as executor:
+        pendentes = deque()
+        for tarefa in tarefas:
+            pendentes.append(executor.submit(_extrair_paginas, *tarefa))
+            if len(pendentes) >= 2 * trabalhadores:
+                yield from _registrar_extracao(pendentes.popleft().result())
+        while pendentes:
+            yield from _registrar_extracao(pendentes.popleft().result())
+
+
+def prefixo_id(path, sha256):
+    """Prefixo dos ids dos trechos: hash do conteúdo e do caminho do PDF.
+
+    O caminho entra no prefixo para que dois PDFs idênticos com nomes
+    diferentes não gerem ids repetidos.
+    """
+    return f"{sha256[:16]}-{hashlib.sha256(path.encode('utf-8')).hexdigest()[:8]}"
+
+
+def dividir_paginas(paginas, fontes, pais=None):
+    """Gera (id, Document) para cada trecho das páginas (path, número, texto).
+
+    Na divisão estrutural, as seções pai são acrescentadas ao dicionário
+    pais ({id: Document}), quando informado.
+    """
+    # Ids derivados do conteúdo e do caminho: a mesma revisão do PDF gera
+    # sempre os mesmos ids
+    if ESTRATEGIA_DIVISAO == "estrutural":
+        # As páginas de cada PDF chegam em sequência e em ordem; o PDF é
+        # dividido inteiro para que as seções possam atravessar páginas
+        for path, grupo in groupby(paginas, key=itemgetter(0)):
+            # As páginas são materializadas antes da medição, que não deve
+            # incluir a espera pela extração
+            paginas_pdf = [(numero, texto) for _, numero, texto in grupo]
+            with etapa("divisao", fonte=path) as medicao:
+                secoes, filhos = dividir_documento(
+                    paginas_pdf, {"source": path}, prefixo_id(path, fontes[path]), limpar_texto
+                )
+                medicao["itens"] = len(filhos)
+            if pais is not None:
+                pais.update(secoes)
+            yield from filhos
+        return
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    for path, numero, texto in paginas:
+        pagina = Document(page_content=texto, metadata={"source": path, "page": numero})
+        with etapa("divisao", fonte=path) as medicao:
+            chunks = splitter.split_documents([pagina])
+            medicao["itens"] = len(chunks)
+        for i, chunk in enumerate(chunks):
+            yield f"{prefixo_id(path, fontes[path])}:{numero}:{i}", Document(
+                page_content=limpar_texto(chunk.page_content), metadata=chunk.metadata
+            )
+
+
+def gerar_chunks(fontes, trabalhadores=TRABALHADORES_EXTRACAO, pais=None):
+    """Gera (id, Document) para cada trecho das fontes {path: sha256}."""
+    yield from dividir_paginas(extrair_paginas(list(fontes), trabalhadores), fontes, pais)
+
+
+def _em_lotes(iteravel, tamanho):
+    lote = []
+    for item in iteravel:
+        lote.append(item)
+        if len(lote) == tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def vetorizar_chunks(chunks, embeddings, tamanho_lote=None, concorrencia=None):
+    """Consome (id, Document) e gera (id, Document, vetor) à medida que os lotes ficam prontos.
+
+    O tamanho do lote e a concorrência vêm do próprio embedder
+    (EMBEDDING_TAMANHO_LOTE e EMBEDDING_CONCORRENCIA no backend google):
+    cada lote enviado cabe em uma única chamada à API.
+    """
+    tamanho_lote = tamanho_lote or embeddings.tamanho_lote
+    concorrencia = concorrencia or getattr(embeddings, "concorrencia", 1)
+
+    def vetorizar(lote):
+        textos = [doc.page_content for _, doc in lote]
+        with etapa("vetorizacao_lote", itens=len(textos), bytes=sum(len(t.encode("utf-8")) for t in textos)):
+            return lote, embeddings.embed_documents(textos)
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        pendentes = deque()
+        for lote in _em_lotes(chunks, tamanho_lote):
+            pendentes.append(executor.submit(vetorizar, lote))
+            while len(pendentes) > concorrencia:
+                yield from _resultado_lote(pendentes.popleft())
+        while pendentes:
+            yield from _resultado_lote(pendentes.popleft())
+
+
+def _resultado_lote(futuro):
+    lote, vetores = futuro.result()
+    for (_id, doc), vetor in zip(lote, vetores):
+        yield _id, doc, vetor
+
+
+def _tamanho_pasta(diretorio):
+    return sum(os.path.getsize(os.path.join(raiz, nome)) for raiz, _, nomes in os.walk(diretorio) for nome in nomes)
+
+
+# === Construção e gravação ===
+# Os trechos vetorizados entram no índice FAISS, no docstore e no BM25 lote
+# a lote, em uma pasta temporária que vira a versão nova no fim: só um lote
+# (ou a amostra de treino dos índices IVF) fica em memória por vez.
+def _lotes(fontes, embeddings, pais):
+    """Lotes [(id, Document, vetor)] das fontes {path: sha256}, à medida que são vetorizados."""
+    return _em_lotes(vetorizar_chunks(gerar_chunks(fontes, pais=pais), embeddings), embeddings.tamanho_lote)
+
+
+def _treinar(lotes):
+    """Cria o índice com os primeiros lotes; retorna (index, lotes com os do treino de volta no início)."""
+    guardados, total = [], 0
+    for lote in lotes:
+        guardados.append(lote)
+        total += len(lote)
+        # Os índices planos não têm treino: basta o primeiro lote para a dimensão
+        if not precisa_treino() or total >= AMOSTRA_TREINO:
+            break
+    if not guardados:
+        return None, lotes
+    with etapa("treino_indice", itens=total, tipo=TIPO_INDICE):
+        index = criar_index(np.array([vetor for lote in guardados for _, _, vetor in lote], dtype="float32"))
+    return index, chain(guardados, lotes)
+
+
+def _indexar(lotes, index, rotulo, docstore, bm25, pais, fontes):
+    """Grava os lotes no índice, no docstore e no BM25; retorna os ids e os ids dos pais de cada fonte."""
+    ids = {path: [] for path in fontes}
+    ids_pais = {path: [] for path in fontes}
+
+    def gravar_pais():
+        # As seções pai de um PDF ficam prontas antes dos seus trechos filho
+        for _id, doc in pais.items():
+            docstore.adicionar(_id, doc)
+            ids_pais[doc.metadata["source"]].append(_id)
+        pais.clear()
+
+    for lote in lotes:
+        with etapa("indexacao_lote", itens=len(lote)):
+            rotulos = np.arange(rotulo, rotulo + len(lote), dtype="int64")
+            index.add_with_ids(np.array([vetor for _, _, vetor in lote], dtype="float32"), rotulos)
+            for (_id, doc, _), r in zip(lote, rotulos.tolist()):
+                docstore.adicionar(_id, doc, r)
+                bm25.adicionar(doc.metadata["source"], r, doc.page_content)
+                ids[doc.metadata["source"]].append(_id)
+            rotulo += len(lote)
+            gravar_pais()
+    gravar_pais()
+    return ids, ids_pais
+
+
+def _pasta_temporaria(manifesto, diretorio):
+    pasta = f"{os.path.join(diretorio, versao_manifesto(manifesto))}.tmp-{os.getpid()}"
+    shutil.rmtree(pasta, ignore_errors=True)
+    os.makedirs(pasta)
+    return pasta
+
+
+def _publicar_versao(index, docstore, bm25, manifesto, pasta, diretorio):
+    """Fecha os arquivos da pasta temporária, que vira a versão do manifesto, e aponta ATUAL para ela.
+
+    O índice FAISS é gravado inteiro, mesmo quando só um PDF mudou: esse
+    custo cresce com o corpus (ver README).
+    """
+    with etapa("gravacao_indice", itens=index.ntotal) as medicao:
+        with etapa("gravacao_faiss"):
+            faiss.write_index(index, os.path.join(pasta, ARQUIVO_FAISS))
+        with etapa("gravacao_docstore"):
+            docstore.fechar()
+        with etapa("gravacao_bm25"):
+            bm25.fechar()
+        medicao["bytes"] = _tamanho_pasta(pasta)
+    with open(os.path.join(pasta, ARQUIVO_MANIFESTO), "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+
+    versao = versao_manifesto(manifesto)
+    destino = os.path.join(diretorio, versao)
+    anterior = _diretorio_atual(diretorio)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(pasta, destino)
+
+    # Troca atômica do ponteiro para a nova versão
+    ponteiro = os.path.join(diretorio, ARQUIVO_ATUAL)
+    with open(f"{ponteiro}.tmp", "w", encoding="utf-8") as f:
+        f.write(versao)
+    os.replace(f"{ponteiro}.tmp", ponteiro)
+
+    # A versão anterior fica até a próxima troca: um processo que leu o
+    # ponteiro antigo ainda pode estar abrindo os arquivos dela. As demais
+    # já foram substituídas duas vezes e podem ser removidas
+    manter = {versao, os.path.basename(anterior) if anterior else None}
+    for nome in os.listdir(diretorio):
+        caminho = os.path.join(diretorio, nome)
+        if nome not in manter and os.path.isdir(caminho):
+            shutil.rmtree(caminho, ignore_errors=True)
+
+
+def construir_indice(embeddings, pdf_paths=PDF_PATHS, diretorio=DIRETORIO_INDICE):
+    manifesto = calcular_manifesto(pdf_paths)
+    fontes = {path: info["sha256"] for path, info in manifesto["fontes"].items()}
+    pasta = _pasta_temporaria(manifesto, diretorio)
+    docstore, bm25, pais = EscritorDocstore(pasta), ConstrutorBM25(pasta), {}
+
+    index, lotes = _treinar(_lotes(fontes, embeddings, pais))
+    if index is None:
+        docstore.fechar()
+        shutil.rmtree(pasta, ignore_errors=True)
+        raise ValueError("Nenhum documento foi carregado.")
+    ids, ids_pais = _indexar(lotes, index, 0, docstore, bm25, pais, fontes)
+
+    for path, info in manifesto["fontes"].items():
+        info["ids"], info["pais"] = ids[path], ids_pais[path]
+    # Fora de "config": não entra na versão, só decide se a atualização incremental serve
+    manifesto["descricao_indice"] = descricao_para(index.d, index.ntotal)
+    _publicar_versao(index, docstore, bm25, manifesto, pasta, diretorio)
+    return manifesto
+
+
+def atualizar_indice(embeddings, pdf_paths=PDF_PATHS, diretorio=DIRETORIO_INDICE):
+    """Reindexa apenas os PDFs novos, alterados ou removidos desde a última versão."""
+    manifesto = calcular_manifesto(pdf_paths)
+    salvo = ler_manifesto(diretorio)
+    if salvo is None or salvo["config"] != manifesto["config"]:
+        return construir_indice(embeddings, pdf_paths, diretorio)
+
+    alteradas, removidas = fontes_alteradas(manifesto, salvo)
+    anterior = _versao_atual(diretorio)
+    obsoletos = [
+        _id
+        for path in alteradas + removidas
+        for chave in ("ids", "pais")
+        for _id in salvo["fontes"].get(path, {}).get(chave, [])
+    ]
+    pasta = _pasta_temporaria(manifesto, diretorio)
+    docstore, bm25, pais = EscritorDocstore(pasta), ConstrutorBM25(pasta, anterior), {}
+
+    # Os documentos que ficam são copiados em bytes da versão anterior, e só
+    # o BM25 dos PDFs alterados é refeito
+    index = faiss.read_index(os.path.join(anterior, ARQUIVO_FAISS))
+    with etapa("copia_docstore"):
+        index.remove_ids(docstore.copiar(anterior, obsoletos))
+    fontes = {path: manifesto["fontes"][path]["sha256"] for path in alteradas}
+    for path in manifesto["fontes"]:
+        if path not in fontes:
+            bm25.manter(path)
+    ids, ids_pais = _indexar(
+        _lotes(fontes, embeddings, pais), index, proximo_rotulo(anterior), docstore, bm25, pais, fontes
+    )
+
+    # Com outro número de vetores, um índice novo teria outro tipo ou outro
+    # número de listas: reconstrói (os vetores saem do cache de embeddings)
+    descricao = descricao_para(index.d, index.ntotal)
+    if descricao != salvo.get("descricao_indice"):
+        docstore.fechar()
+        shutil.rmtree(pasta, ignore_errors=True)
+        return construir_indice(embeddings, pdf_paths, diretorio)
+    if index.ntotal == 0:
+        docstore.fechar()
+        shutil.rmtree(pasta, ignore_errors=True)
+        raise ValueError("Nenhum documento foi carregado.")
+
+    manifesto["descricao_indice"] = descricao
+    for path, info in manifesto["fontes"].items():
+        if path in fontes:
+            info["ids"], info["pais"] = ids[path], ids_pais[path]
+        else:
+            info["ids"], info["pais"] = salvo["fontes"][path]["ids"], salvo["fontes"][path].get("pais", [])
+    _publicar_versao(index, docstore, bm25, manifesto, pasta, diretorio)
+    return manifesto
+
+
+# === Carregamento somente leitura ===
+def _ler_index_faiss(caminho):
+    try:
+        return faiss.read_index(caminho, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(caminho)
+
+
+def _versao_atual(diretorio):
+    atual = _diretorio_atual(diretorio)
+    if atual is None:
+        raise FileNotFoundError(f"Índice não encontrado em {diretorio}")
+    return atual
+
+
+def carregar_indice(embeddings, diretorio=DIRETORIO_INDICE, atual=None):
+    atual = atual or _versao_atual(diretorio)
+    caminho = os.path.join(atual, ARQUIVO_FAISS)
+    with etapa("carga_indice", bytes=os.path.getsize(caminho)) as medicao:
+        index = _ler_index_faiss(caminho)
+        ajustar_nprobe(index)
+        docstore, index_to_docstore_id = carregar_docstore(atual)
+        medicao["itens"] = index.ntotal
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def carregar_base(embeddings, diretorio=DIRETORIO_INDICE):
+    """(vectors, bm25) somente leitura, os dois da mesma versão."""
+    atual = _versao_atual(diretorio)
+    vectors = carregar_indice(embeddings, diretorio, atual=atual)
+    with etapa("carga_bm25"):
+        bm25 = IndiceBM25.carregar(atual, vectors)
+    return vectors, bm25
+
+
+def obter_indice(embeddings, pdf_paths=PDF_PATHS, diretorio=DIRETORIO_INDICE):
+    """(vectors, bm25, manifesto) da versão atual, reconstruída antes se os PDFs mudaram."""
+    manifesto = calcular_manifesto(pdf_paths)
+    if not indice_atualizado(manifesto, diretorio):
+        with _bloqueio(diretorio):
+            # Outro processo pode ter reconstruído enquanto esperávamos
+            if not indice_atualizado(manifesto, diretorio):
+                atualizar_indice(embeddings, pdf_paths, diretorio)
+    return (*carregar_base(embeddings, diretorio), manifesto)
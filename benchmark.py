@@ -0,0 +1,353 @@
+"""Benchmark offline do pipeline RAG do Chat Documenta Wiki.
+
+Usa o backend de embeddings local e um LLM simulado, então roda sem rede
+e sem chaves de API. Mede a ingestão por etapa (extração, divisão e
+vetorização, executadas em sequência para isolar o tempo de cada uma), o
+tempo e a memória de construção do índice, a latência de recuperação
+(p50/p95/p99) e o recall@k em cada modo de busca, a latência ponta a
+ponta, o tamanho do prompt de reescrita ao longo de uma conversa longa e
+o tempo do rascunho de fichas com os grupos de campos em paralelo e em
+sequência (LLM simulado com latência fixa por chamada).
+Uma etapa sintética replica os vetores da base (--escala vezes, com
+ruído) para comparar os tipos de índice em tamanho, latência e recall em
+relação à busca exata. O resultado sai em JSON para acompanhar regressões,
+junto com o resumo das etapas medidas pelo módulo metricas.
+
+Uso:
+    python benchmark.py --saida resultados.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import unicodedata
+
+import faiss
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import base_conhecimento
+import metricas
+from backends_embedding import EmbeddingsLocais
+from contexto import K_CANDIDATOS, estimar_tokens
+from conversa import Conversa
+from indice_vetorial import criar_index, descricao_indice
+from prompts import PROMPT_REESCRITA, prompt_da_intencao
+from rascunho_ficha import FICHAS, gerar_ficha
+from recuperacao import RetrieverHibrido
+from resposta import espera_antes_da_geracao, gerar_em_stream, novos_tempos, recuperar, selecionar_contexto
+from roteador import classificar, fontes_da_intencao
+
+CAMINHO_PERGUNTAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_perguntas.json")
+RESPOSTA_SIMULADA = "Resposta simulada para medir o pipeline sem chamar o LLM. " * 8
+
+
+# === Utilitários ===
+def percentis(valores):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return {}
+
+    def rank(p):
+        return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))]
+
+    return {
+        "p50_ms": rank(50) * 1000,
+        "p95_ms": rank(95) * 1000,
+        "p99_ms": rank(99) * 1000,
+        "media_ms": sum(ordenados) / len(ordenados) * 1000,
+    }
+
+
+def _compacto(texto):
+    # A extração dos PDFs insere espaços no meio das palavras ("pr eenchiment o")
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"\s+", "", texto)
+
+
+def relevante(doc, item):
+    if doc.metadata.get("source") not in item["fontes"]:
+        return False
+    conteudo = _compacto(doc.page_content)
+    return any(_compacto(termo) in conteudo for termo in item["termos"])
+
+
+def memoria_maxima_mb():
+    if resource is None:
+        return None
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+
+
+# === Etapas ===
+def medir_ingestao(pdf_paths, embeddings, trabalhadores):
+    inicio = time.perf_counter()
+    paginas = list(base_conhecimento.extrair_paginas(pdf_paths, trabalhadores))
+    extracao = time.perf_counter() - inicio
+
+    fontes = {path: base_conhecimento.hash_arquivo(path) for path in pdf_paths}
+    pais = {}
+    inicio = time.perf_counter()
+    chunks = [doc.page_content for _, doc in base_conhecimento.dividir_paginas(paginas, fontes, pais)]
+    divisao = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    embeddings.embed_documents(chunks)
+    vetorizacao = time.perf_counter() - inicio
+
+    return {
+        "paginas": len(paginas),
+        "chunks": len(chunks),
+        "secoes_pai": len(pais),
+        "caracteres": sum(len(texto) for _, _, texto in paginas),
+        "extracao_s": extracao,
+        "divisao_s": divisao,
+        "vetorizacao_s": vetorizacao,
+    }
+
+
+def medir_construcao(pdf_paths, embeddings, diretorio):
+    # Roda antes das outras etapas para que o pico de RSS reflita a construção
+    memoria_antes = memoria_maxima_mb()
+    inicio = time.perf_counter()
+    base_conhecimento.construir_indice(embeddings, pdf_paths, diretorio)
+    duracao = time.perf_counter() - inicio
+    memoria_depois = memoria_maxima_mb()
+
+    inicio = time.perf_counter()
+    vectors, bm25 = base_conhecimento.carregar_base(embeddings, diretorio)
+    carga = time.perf_counter() - inicio
+
+    tamanho = sum(
+        os.path.getsize(os.path.join(raiz, nome))
+        for raiz, _, nomes in os.walk(diretorio)
+        for nome in nomes
+        if not nome.endswith(".sqlite")
+    )
+    return vectors, bm25, {
+        "construcao_s": duracao,
+        "carga_s": carga,
+        "vetores": vectors.index.ntotal,
+        "pico_memoria_mb": memoria_depois,
+        "acrescimo_memoria_mb": None if memoria_antes is None else memoria_depois - memoria_antes,
+        "tamanho_em_disco_mb": tamanho / (1024 * 1024),
+    }
+
+
+def medir_recuperacao(vectors, bm25, perguntas, k, repeticoes):
+    resultados = {}
+    for modo, roteado in (("lexical", False), ("vetorial", False), ("hibrido", False), ("hibrido", True)):
+        latencias, acertos = [], 0
+        por_categoria = {}
+        for item in perguntas:
+            fontes = fontes_da_intencao(classificar(item["pergunta"])) if roteado else None
+            retriever = RetrieverHibrido(vectors=vectors, bm25=bm25, modo=modo, fontes=fontes, k=k)
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                docs = retriever.invoke(item["pergunta"])
+                latencias.append(time.perf_counter() - inicio)
+            acertou = any(relevante(doc, item) for doc in docs)
+            acertos += acertou
+            categoria = por_categoria.setdefault(item["categoria"], [0, 0])
+            categoria[0] += acertou
+            categoria[1] += 1
+
+        resultados[f"{modo}_roteado" if roteado else modo] = {
+            **percentis(latencias),
+            f"recall@{k}": acertos / len(perguntas),
+            "recall_por_categoria": {nome: a / n for nome, (a, n) in por_categoria.items()},
+        }
+    return resultados
+
+
+def medir_ponta_a_ponta(vectors, bm25, perguntas, repeticoes):
+    llm = FakeListChatModel(responses=[RESPOSTA_SIMULADA])
+
+    totais, primeiros, tokens_contexto, tokens_prompt = [], [], [], []
+    for item in perguntas:
+        intencao = classificar(item["pergunta"])
+        prompt = prompt_da_intencao(intencao)
+        document_chain = create_stuff_documents_chain(llm, prompt)
+        retriever = RetrieverHibrido(
+            vectors=vectors, bm25=bm25, fontes=fontes_da_intencao(intencao), k=K_CANDIDATOS
+        )
+        for _ in range(repeticoes):
+            tempos = novos_tempos()
+            contexto = selecionar_contexto(recuperar(retriever, item["pergunta"], tempos), tempos)
+            for _ in gerar_em_stream(document_chain, item["pergunta"], contexto, tempos):
+                pass
+            totais.append(tempos["total"])
+            primeiros.append(espera_antes_da_geracao(tempos) + tempos["primeiro_token"])
+            tokens_contexto.append(sum(estimar_tokens(doc.page_content) for doc in contexto))
+            texto_contexto = "\n\n".join(doc.page_content for doc in contexto)
+            tokens_prompt.append(estimar_tokens(prompt.format(context=texto_contexto, input=item["pergunta"])))
+
+    return {
+        "total": percentis(totais),
+        "primeiro_token": percentis(primeiros),
+        "tokens_contexto_medio": sum(tokens_contexto) / len(tokens_contexto),
+        "tokens_prompt_medio": sum(tokens_prompt) / len(tokens_prompt),
+    }
+
+
+def medir_conversa(perguntas, turnos=50):
+    # Perguntas de continuação forçam a reescrita a cada turno
+    llm = FakeListChatModel(responses=[RESPOSTA_SIMULADA])
+    conversa = Conversa()
+    tamanhos = []
+    for turno in range(turnos):
+        pergunta = "e para ficha de programa?" if turno % 2 else perguntas[turno % len(perguntas)]["pergunta"]
+        tamanhos.append(estimar_tokens(PROMPT_REESCRITA.format(
+            resumo=conversa.resumo, historico=conversa.historico(), pergunta=pergunta
+        )))
+        conversa.registrar(conversa.reescrever(pergunta, llm), RESPOSTA_SIMULADA, llm)
+    return {
+        "turnos": turnos,
+        "tokens_reescrita_max": max(tamanhos),
+        "tokens_reescrita_ultimos": tamanhos[-5:],
+    }
+
+
+class LLMComLatencia(FakeListChatModel):
+    """LLM simulado que demora um tempo fixo por chamada, como uma geração curta."""
+
+    latencia: float = 0.3
+
+    def _call(self, *args, **kwargs):
+        time.sleep(self.latencia)
+        return super()._call(*args, **kwargs)
+
+
+def medir_ficha(vectors, bm25, latencia=0.3):
+    llm = LLMComLatencia(responses=[RESPOSTA_SIMULADA], latencia=latencia)
+    resultado = {}
+    for intencao in FICHAS:
+        pedido = f"Proponha uma {FICHAS[intencao].nome} preenchida para o Programa Bolsa Família"
+        medidas = {}
+        for modo, trabalhadores in (("paralelo_s", None), ("sequencial_s", 1)):
+            tempos = novos_tempos()
+            grupos = sum(1 for _ in gerar_ficha(intencao, pedido, llm, vectors, bm25, tempos, trabalhadores))
+            medidas[modo] = tempos["total"]
+        resultado[intencao] = {"grupos": grupos, "latencia_llm_s": latencia, **medidas}
+    return resultado
+
+
+def medir_escala(vectors, embeddings, perguntas, fator, k=10, ruido=0.02):
+    # Corpus sintético: cada vetor da base repetido com ruído gaussiano. As
+    # cópias de um trecho são quase idênticas, então o recall compara os
+    # trechos de origem encontrados, não as cópias exatas
+    textos = [vectors.docstore.search(_id).page_content for _id in vectors.index_to_docstore_id.values()]
+    base = np.array(embeddings.embed_documents(textos), dtype="float32")
+    rng = np.random.default_rng(0)
+    vetores = np.repeat(base, fator, axis=0)
+    vetores += rng.normal(0, ruido, vetores.shape).astype("float32")
+    vetores /= np.linalg.norm(vetores, axis=1, keepdims=True)
+    consultas = np.array(embeddings.embed_documents([item["pergunta"] for item in perguntas]), dtype="float32")
+
+    exato = faiss.IndexFlatL2(vetores.shape[1])
+    exato.add(vetores)
+    _, esperados = exato.search(consultas, k)
+
+    resultados = {"vetores": len(vetores)}
+    for tipo in ("flat", "flat16", "ivf", "ivf16", "ivfpq"):
+        inicio = time.perf_counter()
+        index = criar_index(vetores, tipo)
+        index.add_with_ids(vetores, np.arange(len(vetores), dtype="int64"))
+        construcao = time.perf_counter() - inicio
+
+        latencias, acertos = [], 0
+        for consulta, esperado in zip(consultas, esperados):
+            inicio = time.perf_counter()
+            _, encontrados = index.search(consulta[None, :], k)
+            latencias.append(time.perf_counter() - inicio)
+            origens = set(esperado // fator)
+            acertos += len(set(encontrados[0] // fator) & origens) / len(origens)
+
+        resultados[tipo] = {
+            "descricao": descricao_indice(tipo, vetores.shape[1], len(vetores)),
+            "construcao_s": construcao,
+            "tamanho_mb": len(faiss.serialize_index(index)) / (1024 * 1024),
+            f"recall@{k}_vs_exato": acertos / len(consultas),
+            **percentis(latencias),
+        }
+    return resultados
+
+
+# === Execução ===
+def executar(pdf_paths, perguntas, k, repeticoes, trabalhadores, escala):
+    embeddings = EmbeddingsLocais()
+    pdf_paths = [path for path in pdf_paths if os.path.exists(path)]
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        vectors, bm25, indice = medir_construcao(pdf_paths, embeddings, diretorio)
+        ingestao = medir_ingestao(pdf_paths, embeddings, trabalhadores)
+
+        return {
+            "ambiente": {
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "cpus": os.cpu_count(),
+                "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "parametros": {
+                "pdfs": pdf_paths,
+                "perguntas": len(perguntas),
+                "k": k,
+                "repeticoes": repeticoes,
+                "trabalhadores_extracao": trabalhadores,
+                "embeddings": f"local-{embeddings.dimensao}",
+                "divisao": base_conhecimento.ESTRATEGIA_DIVISAO,
+                "indice": base_conhecimento.TIPO_INDICE,
+            },
+            "ingestao": ingestao,
+            "indice": indice,
+            "recuperacao": medir_recuperacao(vectors, bm25, perguntas, k, repeticoes),
+            "ponta_a_ponta": medir_ponta_a_ponta(vectors, bm25, perguntas, repeticoes),
+            "conversa": medir_conversa(perguntas),
+            "ficha": medir_ficha(vectors, bm25),
+            "escala": medir_escala(vectors, embeddings, perguntas, escala) if escala > 0 else None,
+            # Avaliado por último: inclui as etapas de todas as medições acima
+            "etapas": metricas.resumo(),
+            "memoria_maxima_processo_mb": memoria_maxima_mb(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--perguntas", default=CAMINHO_PERGUNTAS, help="conjunto de perguntas de referência")
+    parser.add_argument("--k", type=int, default=4, help="k do recall@k")
+    parser.add_argument("--repeticoes", type=int, default=5, help="repetições por pergunta")
+    parser.add_argument("--trabalhadores", type=int, default=base_conhecimento.TRABALHADORES_EXTRACAO)
+    parser.add_argument("--escala", type=int, default=100, help="fator do corpus sintético (0 desativa)")
+    args = parser.parse_args()
+
+    with open(args.perguntas, encoding="utf-8") as f:
+        perguntas = json.load(f)
+
+    resultado = executar(
+        base_conhecimento.PDF_PATHS, perguntas, args.k, args.repeticoes, args.trabalhadores, args.escala
+    )
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Cache local de embeddings, endereçado pelo conteúdo de cada trecho.
+
+Cada vetor é gravado em SQLite sob a chave (modelo, tipo, hash do texto
+normalizado). Reconstruções do índice ou mudanças de chunking só enviam
+à API os textos que nunca foram vetorizados; as faltas são enviadas em
+lotes, com concorrência limitada e novas tentativas com backoff para
+falhas transitórias. As perguntas são vetorizadas com uma única tentativa:
+quem responde ao usuário impõe o tempo limite (recuperacao.VetorConsulta).
+"""
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+
+from langchain_core.embeddings import Embeddings
+
+from metricas import contar, etapa
+
+TAMANHO_LOTE = int(os.getenv("EMBEDDING_TAMANHO_LOTE", "100"))
+CONCORRENCIA = int(os.getenv("EMBEDDING_CONCORRENCIA", "4"))
+TENTATIVAS = int(os.getenv("EMBEDDING_TENTATIVAS", "5"))
+
+# Limite de parâmetros por consulta no SQLite
+_LOTE_CONSULTA = 500
+
+
+def normalizar_texto(texto):
+    texto = unicodedata.normalize("NFC", texto)
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def chave_texto(modelo, tipo, texto):
+    bruto = f"{modelo}\0{tipo}\0{normalizar_texto(texto)}".encode("utf-8")
+    return hashlib.sha256(bruto).hexdigest()
+
+
+def erro_transitorio(erro):
+    """Limite de taxa, erro do servidor, timeout ou falha de conexão.
+
+    O cliente da Google encapsula o erro original, então a cadeia de causas
+    também é examinada.
+    """
+    while erro is not None:
+        status = getattr(erro, "code", None) or getattr(erro, "status_code", None)
+        if isinstance(status, int) and (status == 429 or status >= 500):
+            return True
+        if isinstance(erro, (TimeoutError, ConnectionError)) or type(erro).__name__ in (
+            "ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout"
+        ):
+            return True
+        erro = erro.__cause__ or erro.__context__
+    return False
+
+
+def com_retentativas(funcao, *args, tentativas=TENTATIVAS, espera_base=1.0):
+    for tentativa in range(tentativas):
+        try:
+            return funcao(*args)
+        except Exception as e:
+            # Chave inválida ou pedido malformado não melhoram com outra tentativa
+            if tentativa == tentativas - 1 or not erro_transitorio(e):
+                raise
+            contar(f"retentativas_{getattr(funcao, '__name__', 'chamada')}")
+            # Backoff exponencial com jitter para não sincronizar as retentativas
+            time.sleep(espera_base * (2 ** tentativa) * random.uniform(0.5, 1.5))
+
+
+class EmbeddingsComCache(Embeddings):
+    def __init__(self, embeddings, modelo, caminho, tamanho_lote=TAMANHO_LOTE,
+                 concorrencia=CONCORRENCIA):
+        self.embeddings = embeddings
+        self.modelo = modelo
+        self.caminho = caminho
+        self.tamanho_lote = tamanho_lote
+        self.concorrencia = concorrencia
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        with self._conexao() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (chave TEXT PRIMARY KEY, vetor BLOB NOT NULL)"
+            )
+
+    @contextmanager
+    def _conexao(self):
+        with closing(sqlite3.connect(self.caminho, timeout=30)) as conn, conn:
+            yield conn
+
+    # === Leitura e escrita no cache ===
+    def _buscar(self, chaves):
+        encontrados = {}
+        with self._conexao() as conn:
+            for i in range(0, len(chaves), _LOTE_CONSULTA):
+                lote = chaves[i:i + _LOTE_CONSULTA]
+                marcadores = ",".join("?" * len(lote))
+                for chave, blob in conn.execute(
+                    f"SELECT chave, vetor FROM embeddings WHERE chave IN ({marcadores})", lote
+                ):
+                    encontrados[chave] = array("f", blob).tolist()
+        return encontrados
+
+    def _gravar(self, pares):
+        with self._lock, self._conexao() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (chave, vetor) VALUES (?, ?)",
+                [(chave, array("f", vetor).tobytes()) for chave, vetor in pares],
+            )
+
+    # === Vetorização ===
+    def _vetorizar_faltas(self, textos, chaves):
+        lotes = [
+            (textos[i:i + self.tamanho_lote], chaves[i:i + self.tamanho_lote])
+            for i in range(0, len(textos), self.tamanho_lote)
+        ]
+
+        def processar(lote):
+            textos_lote, chaves_lote = lote
+            with etapa("embedding_api", itens=len(textos_lote),
+                       bytes=sum(len(texto.encode("utf-8")) for texto in textos_lote)):
+                vetores = com_retentativas(self.embeddings.embed_documents, textos_lote)
+            self._gravar(zip(chaves_lote, vetores))
+            return vetores
+
+        # A ingestão já envia um lote por chamada, com a concorrência daqui
+        if len(lotes) == 1:
+            return processar(lotes[0])
+        with ThreadPoolExecutor(max_workers=self.concorrencia) as executor:
+            resultados = list(executor.map(processar, lotes))
+        return [vetor for vetores in resultados for vetor in vetores]
+
+    def embed_documents(self, texts):
+        chaves = [chave_texto(self.modelo, "documento", texto) for texto in texts]
+        unicas = list(dict.fromkeys(chaves))
+        encontrados = self._buscar(unicas)
+
+        faltantes = [chave for chave in unicas if chave not in encontrados]
+        if faltantes:
+            texto_por_chave = dict(zip(chaves, texts))
+            vetores = self._vetorizar_faltas(
+                [normalizar_texto(texto_por_chave[chave]) for chave in faltantes], faltantes
+            )
+            encontrados.update(zip(faltantes, vetores))
+
+        self.acertos += len(unicas) - len(faltantes)
+        self.faltas += len(faltantes)
+        contar("cache_embeddings_acerto", len(unicas) - len(faltantes))
+        contar("cache_embeddings_falta", len(faltantes))
+        return [encontrados[chave] for chave in chaves]
+
+    def embed_query(self, text):
+        chave = chave_texto(self.modelo, "consulta", text)
+        encontrado = self._buscar([chave])
+        if chave in encontrado:
+            self.acertos += 1
+            contar("cache_embeddings_acerto")
+            return encontrado[chave]
+
+        self.faltas += 1
+        contar("cache_embeddings_falta")
+        # Uma tentativa só: com a API fora do ar a busca segue sem o vetor
+        with etapa("embedding_api", itens=1, bytes=len(text.encode("utf-8"))):
+            vetor = self.embeddings.embed_query(normalizar_texto(text))
+        self._gravar([(chave, vetor)])
+        return vetor
@@ -0,0 +1,120 @@
+"""Cache semântico de respostas para perguntas repetidas ou quase idênticas.
+
+A busca é feita primeiro pelo texto normalizado da pergunta e, em seguida,
+pela similaridade de cosseno entre embeddings acima de um limiar. As
+entradas expiram por TTL, são descartadas por LRU e todas são invalidadas
+quando a versão do manifesto da base de conhecimento muda.
+
+O embedding da pergunta pode vir de fora (recuperacao.VetorConsulta), o
+mesmo usado depois pela busca; sem ele, o cache pede o seu, com o mesmo
+tempo limite. Ele só é pedido quando o texto exato não está no cache.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metricas import contar, etapa
+from recuperacao import VetorConsulta, sem_acentos
+
+LIMIAR_SIMILARIDADE = float(os.getenv("CACHE_RESPOSTAS_LIMIAR", "0.95"))
+CAPACIDADE = int(os.getenv("CACHE_RESPOSTAS_CAPACIDADE", "256"))
+TTL_SEGUNDOS = int(os.getenv("CACHE_RESPOSTAS_TTL", str(24 * 60 * 60)))
+
+
+def normalizar_pergunta(pergunta):
+    texto = sem_acentos(pergunta.lower())
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+class CacheRespostas:
+    def __init__(self, embeddings, limiar=LIMIAR_SIMILARIDADE, capacidade=CAPACIDADE,
+                 ttl=TTL_SEGUNDOS):
+        self.embeddings = embeddings
+        self.limiar = limiar
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self.versao = None
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _verificar_versao(self, versao):
+        if versao != self.versao:
+            self._entradas.clear()
+            self.versao = versao
+
+    def _remover_expiradas(self):
+        limite = time.time() - self.ttl
+        for chave in [c for c, e in self._entradas.items() if e["criado"] < limite]:
+            del self._entradas[chave]
+
+    def _vetor(self, pergunta, vetor_consulta=None):
+        # Sem embeddings (modo lexical) o cache compara apenas o texto normalizado
+        if self.embeddings is None:
+            return None
+        if vetor_consulta is None or vetor_consulta.consulta != pergunta:
+            vetor_consulta = VetorConsulta(self.embeddings, pergunta)
+        try:
+            vetor = vetor_consulta.obter()
+        except Exception:
+            # API de embeddings lenta ou indisponível: a busca por similaridade é pulada
+            return None
+        norma = np.linalg.norm(vetor)
+        return vetor / norma if norma else vetor
+
+    def buscar(self, pergunta, versao, vetor_consulta=None):
+        """Retorna a entrada {resposta, contexto, ...} ou None."""
+        with etapa("cache_respostas") as medicao:
+            entrada = self._procurar(pergunta, versao, vetor_consulta)
+            medicao["acerto"] = entrada is not None
+        contar("cache_respostas_acerto" if entrada is not None else "cache_respostas_falta")
+        return entrada
+
+    def _procurar(self, pergunta, versao, vetor_consulta):
+        chave = normalizar_pergunta(pergunta)
+        with self._lock:
+            self._verificar_versao(versao)
+            self._remover_expiradas()
+            if chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                return self._entradas[chave]
+            chaves = [c for c, e in self._entradas.items() if e["vetor"] is not None]
+            if self.embeddings is None or not chaves:
+                return None
+            matriz = np.stack([self._entradas[c]["vetor"] for c in chaves])
+
+        # O embedding da pergunta é calculado fora do lock
+        vetor = self._vetor(pergunta, vetor_consulta)
+        if vetor is None:
+            return None
+        similaridades = matriz @ vetor
+        melhor = int(np.argmax(similaridades))
+        if similaridades[melhor] < self.limiar:
+            return None
+
+        with self._lock:
+            entrada = self._entradas.get(chaves[melhor])
+            if entrada is not None and self.versao == versao:
+                self._entradas.move_to_end(chaves[melhor])
+                return entrada
+        return None
+
+    def gravar(self, pergunta, versao, resposta, contexto, vetor_consulta=None):
+        chave = normalizar_pergunta(pergunta)
+        entrada = {
+            "pergunta": pergunta,
+            "vetor": self._vetor(pergunta, vetor_consulta),
+            "resposta": resposta,
+            "contexto": contexto,
+            "criado": time.time(),
+        }
+        with self._lock:
+            self._verificar_versao(versao)
+            self._entradas[chave] = entrada
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
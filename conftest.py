@@ -0,0 +1,2 @@
+# Na raiz do repositório: o pytest põe esta pasta no sys.path e os testes
+# importam os módulos do app diretamente
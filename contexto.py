@@ -0,0 +1,121 @@
+"""Montagem do contexto enviado ao prompt, dentro de um orçamento de tokens.
+
+Entre o retriever e o prompt:
+1. trechos da mesma página que se sobrepõem (overlap do splitter) ou que
+   estão contidos um no outro são unidos em um só;
+2. os candidatos são reordenados por MMR, equilibrando relevância (ordem
+   do retriever) e diversidade (similaridade lexical entre trechos);
+3. os trechos são empacotados até o orçamento de tokens.
+
+A similaridade usa os tokens do BM25, então nada disso faz chamadas de rede.
+"""
+import os
+
+from langchain_core.documents import Document
+
+from metricas import etapa
+from recuperacao import tokenizar
+
+# Janela de 8192 tokens do Llama3-8b-8192: o prompt fixo ocupa ~1.200 tokens
+# e o contexto é limitado para sobrar espaço para a pergunta e respostas longas
+ORCAMENTO_CONTEXTO_TOKENS = int(os.getenv("ORCAMENTO_CONTEXTO_TOKENS", "1000"))
+K_CANDIDATOS = int(os.getenv("K_CANDIDATOS", "8"))
+LAMBDA_MMR = float(os.getenv("LAMBDA_MMR", "0.7"))
+SOBREPOSICAO_MINIMA = 12
+
+# Aproximação conservadora para português no tokenizador do Llama 3
+CARACTERES_POR_TOKEN = 3.0
+
+
+def estimar_tokens(texto):
+    return int(len(texto) / CARACTERES_POR_TOKEN) + 1
+
+
+# === União de trechos sobrepostos ===
+def _sobreposicao(a, b):
+    """Tamanho do maior sufixo de a que é prefixo de b."""
+    for tamanho in range(min(len(a), len(b)), SOBREPOSICAO_MINIMA - 1, -1):
+        if a.endswith(b[:tamanho]):
+            return tamanho
+    return 0
+
+
+def _unir(a, b):
+    if b in a:
+        return a
+    if a in b:
+        return b
+    tamanho = _sobreposicao(a, b)
+    if tamanho:
+        return a + b[tamanho:]
+    tamanho = _sobreposicao(b, a)
+    if tamanho:
+        return b + a[tamanho:]
+    return None
+
+
+def _passe_uniao(docs):
+    unidos = []
+    for doc in docs:
+        chave = (doc.metadata.get("source"), doc.metadata.get("page"))
+        for i, existente in enumerate(unidos):
+            if (existente.metadata.get("source"), existente.metadata.get("page")) != chave:
+                continue
+            texto = _unir(existente.page_content, doc.page_content)
+            if texto is not None:
+                unidos[i] = Document(page_content=texto, metadata=existente.metadata)
+                break
+        else:
+            unidos.append(doc)
+    return unidos
+
+
+def unir_sobrepostos(docs):
+    """Une trechos da mesma página; a posição do primeiro trecho é mantida."""
+    # Uma união pode criar nova sobreposição com outro trecho: repete até estabilizar
+    while True:
+        unidos = _passe_uniao(docs)
+        if len(unidos) == len(docs):
+            return unidos
+        docs = unidos
+
+
+# === Diversificação por MMR ===
+def _similaridade(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def ordenar_mmr(docs, lambda_mmr=LAMBDA_MMR):
+    termos = [set(tokenizar(doc.page_content)) for doc in docs]
+    # Relevância decrescente conforme a posição dada pelo retriever
+    relevancia = [1.0 - i / len(docs) for i in range(len(docs))]
+    restantes = list(range(len(docs)))
+    escolhidos = []
+    while restantes:
+        melhor = max(
+            restantes,
+            key=lambda i: lambda_mmr * relevancia[i] - (1 - lambda_mmr) * max(
+                (_similaridade(termos[i], termos[j]) for j in escolhidos), default=0.0
+            ),
+        )
+        escolhidos.append(melhor)
+        restantes.remove(melhor)
+    return [docs[i] for i in escolhidos]
+
+
+# === Empacotamento no orçamento ===
+def montar_contexto(docs, orcamento_tokens=ORCAMENTO_CONTEXTO_TOKENS):
+    if not docs:
+        return []
+    with etapa("montagem_contexto", candidatos=len(docs)) as medicao:
+        selecionados, usados = [], 0
+        for doc in ordenar_mmr(unir_sobrepostos(docs)):
+            custo = estimar_tokens(doc.page_content)
+            if usados + custo > orcamento_tokens:
+                continue
+            selecionados.append(doc)
+            usados += custo
+        medicao.update(itens=len(selecionados), tokens=usados)
+    return selecionados
@@ -0,0 +1,117 @@
+"""Conversa com várias perguntas e histórico de tamanho limitado.
+
+O histórico usado nos prompts tem duas partes:
+- as trocas mais recentes, na íntegra, até TOKENS_HISTORICO_RECENTE;
+- um resumo das trocas mais antigas, de até TOKENS_RESUMO, atualizado de
+  forma incremental: cada troca que sai da janela recente é incorporada ao
+  resumo anterior em uma única chamada curta ao LLM.
+
+Perguntas de continuação ("e para ficha de programa?") são reescritas
+como perguntas independentes antes da busca, a partir desse histórico.
+A resposta é gerada só com a pergunta reescrita e o contexto recuperado,
+então o custo de cada pergunta não cresce com o tamanho da conversa.
+"""
+import os
+import re
+
+from contexto import CARACTERES_POR_TOKEN, estimar_tokens
+from metricas import etapa
+from prompts import PROMPT_REESCRITA, PROMPT_RESUMO
+from recuperacao import sem_acentos
+
+TOKENS_HISTORICO_RECENTE = int(os.getenv("TOKENS_HISTORICO_RECENTE", "500"))
+TOKENS_RESUMO = int(os.getenv("TOKENS_RESUMO", "200"))
+# Mensagens longas entram cortadas no histórico dos prompts auxiliares
+TOKENS_MENSAGEM_HISTORICO = 150
+
+PALAVRAS_PERGUNTA_CURTA = 6
+# Conectivo inicial seguido de espaço, conferido antes de tirar os acentos:
+# "É possível..." e "E-mail..." não são continuação
+_CONECTIVO = re.compile(r"^(e|mas|ent[aã]o|tamb[eé]m|agora)\s")
+_REFERENCIA = re.compile(
+    r"\b(isso|isto|disso|nisso|esse|essa|esses|essas|desse|dessa|nesse|nessa|"
+    r"ele|ela|eles|elas|dele|dela|nele|nela|aquilo|acima|anterior)\b"
+)
+# Palavras que não dizem o assunto: uma pergunta curta feita só com elas
+# ("Como assim?", "Pode dar um exemplo?") depende da anterior
+_VAGAS = set("""
+a as o os um uma de do da e mas entao tambem agora como assim qual quais que porque pq quando onde quem
+sim nao ok certo pode poderia explicar explique detalhar detalhe detalhes melhor mais outro outra
+exemplo exemplos me mostra mostrar dar da continue continua seguir depois antes ai la
+""".split())
+
+
+def parece_continuacao(pergunta):
+    """Perguntas com referências ao que veio antes, ou curtas e vagas ("Como assim?")."""
+    minusculas = pergunta.lower().strip()
+    if _CONECTIVO.search(minusculas) is not None:
+        return True
+    texto = sem_acentos(minusculas)
+    if _REFERENCIA.search(texto) is not None:
+        return True
+    palavras = re.findall(r"\w+", texto)
+    return len(palavras) <= PALAVRAS_PERGUNTA_CURTA and all(palavra in _VAGAS for palavra in palavras)
+
+
+def _cortar(texto, tokens):
+    limite = int(tokens * CARACTERES_POR_TOKEN)
+    if len(texto) <= limite:
+        return texto
+    return texto[:limite].rsplit(" ", 1)[0] + "…"
+
+
+class Conversa:
+    def __init__(self, tokens_recentes=TOKENS_HISTORICO_RECENTE, tokens_resumo=TOKENS_RESUMO):
+        self.tokens_recentes = tokens_recentes
+        self.tokens_resumo = tokens_resumo
+        self.resumo = ""
+        self.recentes = []  # [(pergunta, resposta)]
+
+    def vazia(self):
+        return not self.resumo and not self.recentes
+
+    def historico(self):
+        return "\n".join(f"Usuário: {pergunta}\nAssistente: {resposta}" for pergunta, resposta in self.recentes)
+
+    def _tamanho_recentes(self):
+        return sum(estimar_tokens(pergunta) + estimar_tokens(resposta) for pergunta, resposta in self.recentes)
+
+    def registrar(self, pergunta, resposta, llm):
+        self.recentes.append((
+            _cortar(pergunta, TOKENS_MENSAGEM_HISTORICO), _cortar(resposta, TOKENS_MENSAGEM_HISTORICO)
+        ))
+        # As trocas mais antigas saem da janela uma a uma e entram no resumo
+        while len(self.recentes) > 1 and self._tamanho_recentes() > self.tokens_recentes:
+            self.resumo = self._resumir(llm, *self.recentes.pop(0))
+
+    def _resumir(self, llm, pergunta, resposta):
+        try:
+            with etapa("resumo_conversa"):
+                resumo = llm.invoke(PROMPT_RESUMO.format_messages(
+                    resumo=self.resumo or "(vazio)", pergunta=pergunta, resposta=resposta,
+                    palavras=self.tokens_resumo // 2,
+                )).content.strip()
+        except Exception:
+            # Sem o LLM, o resumo guarda só as perguntas, das mais recentes para trás
+            linhas = f"{self.resumo}\n- {pergunta}".strip().splitlines()
+            while len(linhas) > 1 and estimar_tokens("\n".join(linhas)) > self.tokens_resumo:
+                linhas.pop(0)
+            return "\n".join(linhas)
+        return _cortar(resumo, self.tokens_resumo)
+
+    def precisa_reescrever(self, pergunta):
+        return not self.vazia() and parece_continuacao(pergunta)
+
+    def reescrever(self, pergunta, llm):
+        """Pergunta independente para a busca; sem histórico, devolve a própria pergunta."""
+        if not self.precisa_reescrever(pergunta):
+            return pergunta
+        try:
+            reescrita = llm.invoke(PROMPT_REESCRITA.format_messages(
+                resumo=self.resumo or "(vazio)", historico=self.historico(), pergunta=pergunta
+            )).content.strip()
+        except Exception:
+            return pergunta
+        # O modelo às vezes acrescenta explicações depois da pergunta
+        linhas = [linha.strip().strip('"') for linha in reescrita.splitlines() if linha.strip()]
+        return linhas[0] if linhas else pergunta
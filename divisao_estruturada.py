@@ -0,0 +1,136 @@
+"""Divisão dos PDFs guiada pela estrutura do texto.
+
+O texto de cada PDF é organizado em seções a partir de títulos
+numerados ("2.1. Acessando as Fichas"), títulos em caixa alta e rótulos
+de campo das fichas ("Unidade de Medida"). Dentro de cada seção, itens de
+lista e passos numerados formam unidades próprias e o restante do texto é
+agrupado por frases.
+
+As seções viram documentos "pai", devolvidos como contexto ao LLM; as
+unidades menores viram documentos "filho", os únicos vetorizados e
+indexados. Cada filho leva o título da seção no texto e o id do pai nos
+metadados.
+"""
+import re
+
+from langchain_core.documents import Document
+
+from recuperacao import dividir_frases
+
+TAMANHO_FILHO = 450
+TAMANHO_MAXIMO_PAI = 1500
+
+_TITULO_NUMERADO = re.compile(r"^\d+(\.\d+)*\.?\s+\S")
+_ITEM = re.compile(r"^(\d+[.)]\s|[a-z]\)\s|[-•‒▪]\s*|o\s+[A-ZÀ-Ú])")
+# Comentários de revisão do Word ("Comentado [RM2R1]: ...") também são ruído
+_RUIDO = re.compile(r"^(https?://|\d+/\d+$|Powered by|\d+$|Comentado \[)")
+_ROTULO = re.compile(r"[\w\s()/-]+")
+# Rodapé de impressão das páginas da Wiki, às vezes colado no fim de uma linha
+_RODAPE = re.compile(r"\d{2}/\d{2}/\d{4}, \d{2}:\d{2} .*$")
+# Ícones das páginas da Wiki viram caracteres de uso privado na extração
+_USO_PRIVADO = re.compile(r"[\ue000-\uf8ff\U000f0000-\U0010ffff]")
+_FIM_DE_FRASE = (".", ":", ";", "!", "?")
+
+
+def limpar_linha(linha):
+    """Linha sem ícones nem rodapé de impressão; vazia se for só ruído."""
+    linha = _RODAPE.sub("", _USO_PRIVADO.sub("", linha)).strip()
+    return "" if _RUIDO.match(linha) else linha
+
+
+def _linhas(paginas):
+    for numero, texto in paginas:
+        for linha in texto.splitlines():
+            linha = limpar_linha(linha)
+            if linha:
+                yield numero, linha
+
+
+def _eh_titulo(linha, anterior_fechou):
+    letras = [c for c in linha if c.isalpha()]
+    if not letras or len(linha) > 90 or not linha[0].isalnum():
+        return False
+    maiusculas = sum(c.isupper() for c in letras) / len(letras)
+    if maiusculas > 0.7 and len(letras) > 3:
+        return True
+    if not anterior_fechou or len(linha) > 60 or len(linha.split()) > 8:
+        return False
+    numerado = _TITULO_NUMERADO.match(linha)
+    if numerado:
+        linha = linha[numerado.end() - 1:]
+    # Títulos e rótulos de campo: curtos, iniciados em maiúscula e sem pontuação
+    return linha[0].isupper() and _ROTULO.fullmatch(linha) is not None
+
+
+def _secoes(paginas):
+    """Retorna [(título ou None, [(página, unidade)])]."""
+    secoes = [(None, [])]
+    unidade, pagina_unidade = [], None
+    anterior_fechou = True
+
+    def fechar_unidade():
+        if unidade:
+            secoes[-1][1].append((pagina_unidade, " ".join(unidade)))
+            unidade.clear()
+
+    for numero, linha in _linhas(paginas):
+        if _eh_titulo(linha, anterior_fechou):
+            fechar_unidade()
+            secoes.append((linha, []))
+            anterior_fechou = True
+            continue
+        if _ITEM.match(linha) or anterior_fechou:
+            fechar_unidade()
+        if not unidade:
+            pagina_unidade = numero
+        unidade.append(linha)
+        anterior_fechou = linha.endswith(_FIM_DE_FRASE)
+    fechar_unidade()
+    return [(titulo, unidades) for titulo, unidades in secoes if unidades]
+
+
+def _agrupar(itens, limite):
+    grupo, tamanho = [], 0
+    for pagina, texto in itens:
+        if grupo and tamanho + len(texto) > limite:
+            yield grupo
+            grupo, tamanho = [], 0
+        grupo.append((pagina, texto))
+        tamanho += len(texto) + 1
+    if grupo:
+        yield grupo
+
+
+def _partes(unidades):
+    # Unidades longas são quebradas em frases antes de agrupar
+    for pagina, unidade in unidades:
+        if len(unidade) <= TAMANHO_FILHO:
+            yield pagina, unidade
+        else:
+            yield from ((pagina, frase) for frase in dividir_frases(unidade))
+
+
+def dividir_documento(paginas, metadata, prefixo_id, limpar=str.strip):
+    """Divide as páginas [(número, texto)] de um PDF, em ordem.
+
+    Retorna (pais, filhos), cada um uma lista de (id, Document). Uma seção
+    pode atravessar páginas; a página nos metadados é a do início do trecho.
+    """
+    pais, filhos = [], []
+    for titulo, unidades in _secoes(paginas):
+        for grupo in _agrupar(unidades, TAMANHO_MAXIMO_PAI):
+            id_pai = f"{prefixo_id}:s{len(pais)}"
+            conteudo = "\n".join(([titulo] if titulo else []) + [texto for _, texto in grupo])
+            pais.append((id_pai, Document(
+                page_content=limpar(conteudo),
+                metadata={**metadata, "page": grupo[0][0], "secao": titulo},
+            )))
+            for partes in _agrupar(_partes(grupo), TAMANHO_FILHO):
+                texto_filho = " ".join(texto for _, texto in partes)
+                if titulo:
+                    texto_filho = f"{titulo}: {texto_filho}"
+                filhos.append((f"{prefixo_id}:{len(filhos)}", Document(
+                    page_content=limpar(texto_filho),
+                    metadata={**metadata, "page": partes[0][0], "pai": id_pai},
+                )))
+    return pais, filhos
@@ -0,0 +1,406 @@
+"""Acesso compartilhado ao LLM, respeitando os limites do provedor.
+
+Todas as chamadas ao LLM do processo passam por GatewayLLM, que:
+- limita as chamadas simultâneas por modelo (LLM_CONCORRENCIA) e recusa
+  novas chamadas quando a fila de espera passa de LLM_FILA_MAXIMA;
+- distribui requisições e tokens por minuto com dois token buckets, nos
+  limites da Groq de cada modelo (LIMITES_MODELOS, ajustáveis por
+  LLM_REQUISICOES_POR_MINUTO_<MODELO> e LLM_TOKENS_POR_MINUTO_<MODELO>);
+  a saída é reservada pela estimativa e acertada com os tokens gerados,
+  e tentativas que falham sem gerar nada devolvem a reserva;
+  um 429 com retry-after pausa o bucket pelo tempo pedido pelo provedor;
+- junta chamadas idênticas em andamento: a segunda pergunta igual
+  acompanha o stream da primeira em vez de pagar outra geração;
+- repete falhas transitórias (429, 5xx, timeout) com backoff e jitter;
+- usa o modelo reserva (LLM_MODELO_RESERVA) quando o principal falha, a
+  espera passa de LLM_ESPERA_MAXIMA ou os orçamentos de latência do
+  primeiro token (medida só nos streams) e de erros do principal são
+  estourados nas últimas chamadas. Nesse último caso o principal fica de
+  lado por LLM_PAUSA_RESERVA segundos.
+
+O estado (filas, buckets, orçamentos) é do processo e indexado pelo nome
+do modelo, então vale para todas as sessões do Streamlit.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from contexto import estimar_tokens
+from metricas import contar, etapa
+
+MODELO = os.getenv("LLM_MODELO", "Llama3-8b-8192")
+MODELO_RESERVA = os.getenv("LLM_MODELO_RESERVA", "llama3-70b-8192")  # vazio desativa
+
+# Limites da Groq no plano gratuito: (requisições, tokens) por minuto
+LIMITES_MODELOS = {
+    "llama3-8b-8192": (30, 30000),
+    "llama3-70b-8192": (30, 6000),
+}
+# Para modelos fora da tabela
+REQUISICOES_POR_MINUTO = int(os.getenv("LLM_REQUISICOES_POR_MINUTO", "30"))
+TOKENS_POR_MINUTO = int(os.getenv("LLM_TOKENS_POR_MINUTO", "30000"))
+CONCORRENCIA = int(os.getenv("LLM_CONCORRENCIA", "4"))
+FILA_MAXIMA = int(os.getenv("LLM_FILA_MAXIMA", "32"))
+ESPERA_MAXIMA = float(os.getenv("LLM_ESPERA_MAXIMA", "10"))
+TENTATIVAS = int(os.getenv("LLM_TENTATIVAS", "3"))
+
+# Orçamentos do modelo principal, avaliados nas últimas JANELA_ORCAMENTO chamadas
+ORCAMENTO_LATENCIA = float(os.getenv("LLM_ORCAMENTO_LATENCIA", "8"))  # p95 do 1º token, s
+ORCAMENTO_ERROS = float(os.getenv("LLM_ORCAMENTO_ERROS", "0.2"))
+PAUSA_RESERVA = float(os.getenv("LLM_PAUSA_RESERVA", "60"))
+JANELA_ORCAMENTO = 20
+MINIMO_ORCAMENTO = 5
+
+# Tokens de saída reservados no bucket quando o modelo não define max_tokens
+TOKENS_SAIDA = 500
+
+
+def criar_llm(groq_api_key, modelo=MODELO, reserva=MODELO_RESERVA, **parametros):
+    """GatewayLLM sobre a Groq; os parâmetros valem para os dois modelos."""
+    from langchain_groq import ChatGroq
+
+    # As retentativas ficam com o gateway, que conhece os limites de todos
+    def groq(nome):
+        return ChatGroq(groq_api_key=groq_api_key, model_name=nome, max_retries=0, **parametros)
+
+    return GatewayLLM(principal=groq(modelo), reserva=groq(reserva) if reserva else None)
+
+
+# === Limites por modelo ===
+def limites_modelo(nome):
+    """(requisições, tokens) por minuto do modelo: variável do modelo, tabela ou padrão."""
+    requisicoes, tokens = LIMITES_MODELOS.get(nome.lower(), (REQUISICOES_POR_MINUTO, TOKENS_POR_MINUTO))
+    # llama3-70b-8192 -> LLM_TOKENS_POR_MINUTO_LLAMA3_70B_8192
+    sufixo = re.sub(r"\W", "_", nome.upper())
+    return (
+        int(os.getenv(f"LLM_REQUISICOES_POR_MINUTO_{sufixo}", requisicoes)),
+        int(os.getenv(f"LLM_TOKENS_POR_MINUTO_{sufixo}", tokens)),
+    )
+
+
+class BaldeTokens:
+    """Token bucket com reposição contínua de por_minuto unidades."""
+
+    def __init__(self, por_minuto):
+        self.capacidade = por_minuto
+        self.disponivel = float(por_minuto)
+        self.taxa = por_minuto / 60
+        self.atualizado = time.monotonic()
+        self.pausado_ate = 0.0
+        self._lock = threading.Lock()
+
+    def _repor(self, agora):
+        self.disponivel = min(self.capacidade, self.disponivel + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+
+    def reservar(self, quantidade):
+        """Desconta a quantidade já e retorna quantos segundos esperar por ela."""
+        with self._lock:
+            agora = time.monotonic()
+            self._repor(agora)
+            self.disponivel -= min(quantidade, self.capacidade)
+            return max(0.0, -self.disponivel / self.taxa, self.pausado_ate - agora)
+
+    def devolver(self, quantidade):
+        with self._lock:
+            self.disponivel = min(self.capacidade, self.disponivel + min(quantidade, self.capacidade))
+
+    def acertar(self, reservado, usado):
+        """Troca a reserva pelo consumo real; o excesso vira espera para as próximas chamadas."""
+        with self._lock:
+            self._repor(time.monotonic())
+            self.disponivel = min(self.capacidade, self.disponivel + min(reservado, self.capacidade) - usado)
+
+    def pausar(self, segundos):
+        # O provedor pediu espera (retry-after): nada sai antes disso
+        with self._lock:
+            self.pausado_ate = max(self.pausado_ate, time.monotonic() + segundos)
+
+
+class _EstadoModelo:
+    def __init__(self, nome):
+        self.nome = nome
+        requisicoes, tokens = limites_modelo(nome)
+        self.requisicoes = BaldeTokens(requisicoes)
+        self.tokens = BaldeTokens(tokens)
+        self.vagas = threading.BoundedSemaphore(CONCORRENCIA)
+        self.aguardando = 0
+        self.chamadas = deque(maxlen=JANELA_ORCAMENTO)  # [(latência do 1º token ou None, falhou)]
+        self.degradado_ate = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def vaga(self, tokens, espera_maxima=None):
+        """Espera os buckets e uma vaga de concorrência; sem espera_maxima, espera o necessário."""
+        with self._lock:
+            if self.aguardando >= FILA_MAXIMA:
+                contar("llm_fila_cheia")
+                raise RuntimeError(f"Fila de chamadas ao LLM {self.nome} cheia")
+            self.aguardando += 1
+        try:
+            with etapa("llm_espera", modelo=self.nome, tokens=tokens):
+                inicio = time.monotonic()
+                espera = max(self.requisicoes.reservar(1), self.tokens.reservar(tokens))
+                if espera_maxima is not None and espera > espera_maxima:
+                    self.requisicoes.devolver(1)
+                    self.tokens.devolver(tokens)
+                    raise TimeoutError(f"Limite de taxa do LLM {self.nome}: espera de {espera:.1f} s")
+                time.sleep(espera)
+                restante = None if espera_maxima is None else max(0.0, espera_maxima - (time.monotonic() - inicio))
+                if not self.vagas.acquire(timeout=restante):
+                    # A chamada não sai: a reserva volta aos buckets
+                    self.requisicoes.devolver(1)
+                    self.tokens.devolver(tokens)
+                    raise TimeoutError(f"Sem vaga para o LLM {self.nome} em {espera_maxima:.1f} s")
+        finally:
+            with self._lock:
+                self.aguardando -= 1
+        try:
+            yield
+        finally:
+            self.vagas.release()
+
+    def registrar(self, latencia, falhou):
+        with self._lock:
+            self.chamadas.append((latencia, falhou))
+            if len(self.chamadas) < MINIMO_ORCAMENTO:
+                return
+            # Chamadas sem stream não têm primeiro token: só contam nos erros
+            latencias = sorted(latencia for latencia, _ in self.chamadas if latencia is not None)
+            p95 = latencias[min(len(latencias) - 1, int(0.95 * len(latencias)))] if latencias else 0.0
+            erros = sum(falhou for _, falhou in self.chamadas) / len(self.chamadas)
+            if (len(latencias) >= MINIMO_ORCAMENTO and p95 > ORCAMENTO_LATENCIA) or erros > ORCAMENTO_ERROS:
+                self.degradado_ate = time.monotonic() + PAUSA_RESERVA
+                self.chamadas.clear()
+                contar("llm_orcamento_estourado")
+
+    def degradado(self):
+        return time.monotonic() < self.degradado_ate
+
+
+_estados = {}
+_lock_estados = threading.Lock()
+
+
+def _estado(modelo):
+    nome = getattr(modelo, "model_name", None) or type(modelo).__name__
+    with _lock_estados:
+        if nome not in _estados:
+            _estados[nome] = _EstadoModelo(nome)
+        return _estados[nome]
+
+
+# === Erros do provedor ===
+def _status(erro):
+    return getattr(erro, "status_code", None) or getattr(getattr(erro, "response", None), "status_code", None)
+
+
+def _retentavel(erro):
+    status = _status(erro)
+    if status is None:
+        # Sem resposta HTTP: falha de conexão ou timeout
+        return isinstance(erro, (TimeoutError, ConnectionError)) or type(erro).__name__ in (
+            "APIConnectionError", "APITimeoutError"
+        )
+    return status == 429 or status >= 500
+
+
+def _espera_pedida(erro):
+    cabecalhos = getattr(getattr(erro, "response", None), "headers", None) or {}
+    try:
+        return float(cabecalhos.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# === Chamadas idênticas em andamento ===
+class _Voo:
+    """Chamada em andamento; as idênticas acompanham as partes publicadas."""
+
+    def __init__(self):
+        self.partes = []
+        self.concluido = False
+        self.erro = None
+        self._condicao = threading.Condition()
+
+    def publicar(self, parte):
+        with self._condicao:
+            self.partes.append(parte)
+            self._condicao.notify_all()
+
+    def concluir(self, erro=None):
+        with self._condicao:
+            self.concluido, self.erro = True, erro
+            self._condicao.notify_all()
+
+    def acompanhar(self):
+        lidas = 0
+        while True:
+            with self._condicao:
+                self._condicao.wait_for(lambda: len(self.partes) > lidas or self.concluido)
+                novas, concluido, erro = self.partes[lidas:], self.concluido, self.erro
+            for parte in novas:
+                # Cada consumidor recebe sua cópia: o LangChain altera a mensagem
+                yield parte.copy()
+            lidas += len(novas)
+            if concluido:
+                if erro is not None:
+                    raise erro
+                return
+
+
+_voos = {}
+_lock_voos = threading.Lock()
+
+
+def _entrar(chave):
+    """Retorna (voo, é_o_primeiro)."""
+    with _lock_voos:
+        if chave in _voos:
+            return _voos[chave], False
+        _voos[chave] = _Voo()
+        return _voos[chave], True
+
+
+def _sair(chave):
+    with _lock_voos:
+        _voos.pop(chave, None)
+
+
+# === Gateway ===
+class GatewayLLM(BaseChatModel):
+    principal: BaseChatModel
+    reserva: Optional[BaseChatModel] = None
+    tentativas: int = TENTATIVAS
+    espera_maxima: float = ESPERA_MAXIMA
+
+    @property
+    def _llm_type(self):
+        return "gateway-llm"
+
+    def _modelos(self):
+        if self.reserva is None:
+            return [self.principal]
+        # Com os orçamentos estourados, o principal só é usado se a reserva falhar
+        if _estado(self.principal).degradado():
+            return [self.reserva, self.principal]
+        return [self.principal, self.reserva]
+
+    def _chave(self, messages, stop, kwargs, modo):
+        bruto = json.dumps(
+            [modo, getattr(self.principal, "model_name", None), stop, sorted(kwargs.items()),
+             [(mensagem.type, mensagem.content) for mensagem in messages]],
+            ensure_ascii=False, default=str,
+        )
+        return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+    def _tokens_entrada(self, messages):
+        return sum(estimar_tokens(mensagem.content) for mensagem in messages if isinstance(mensagem.content, str))
+
+    def _chamar(self, modelo, messages, stop, kwargs, modo, espera_maxima):
+        estado = _estado(modelo)
+        entrada = self._tokens_entrada(messages)
+        tokens = entrada + (getattr(modelo, "max_tokens", None) or TOKENS_SAIDA)
+        for tentativa in range(self.tentativas):
+            espera = None
+            with estado.vaga(tokens, espera_maxima):
+                inicio = time.perf_counter()
+                emitiu = False
+                gerado = []
+                try:
+                    if modo == "stream":
+                        for parte in modelo.stream(messages, stop=stop, **kwargs):
+                            if not emitiu:
+                                estado.registrar(time.perf_counter() - inicio, False)
+                                emitiu = True
+                            gerado.append(parte.content)
+                            yield parte
+                    else:
+                        resposta = modelo.invoke(messages, stop=stop, **kwargs)
+                        # A duração do invoke inclui toda a geração: fora do orçamento do 1º token
+                        estado.registrar(None, False)
+                        emitiu = True
+                        gerado.append(resposta.content)
+                        yield resposta
+                    return
+                except Exception as e:
+                    if not emitiu:
+                        estado.registrar(time.perf_counter() - inicio, True)
+                    espera = _espera_pedida(e)
+                    if espera:
+                        contar("llm_limite_taxa")
+                        estado.requisicoes.pausar(espera)
+                        estado.tokens.pausar(espera)
+                    # Depois do primeiro token não há como repetir sem duplicar o texto
+                    if emitiu or not _retentavel(e) or tentativa == self.tentativas - 1:
+                        raise
+                finally:
+                    # Vale também para falhas e streams abandonados: a reserva
+                    # pela saída máxima vira o consumo real, e uma tentativa
+                    # que não gerou nada devolve a requisição e os tokens
+                    if emitiu:
+                        estado.tokens.acertar(tokens, entrada + estimar_tokens("".join(map(str, gerado))))
+                    else:
+                        estado.requisicoes.devolver(1)
+                        estado.tokens.devolver(tokens)
+            contar("llm_retentativas")
+            # Backoff exponencial com jitter; o retry-after já pausou os buckets
+            if not espera:
+                time.sleep(2 ** tentativa * random.uniform(0.5, 1.5))
+
+    def _com_reserva(self, messages, stop, kwargs, modo):
+        modelos = self._modelos()
+        for i, modelo in enumerate(modelos):
+            ultimo = i == len(modelos) - 1
+            emitiu = False
+            try:
+                # O último modelo espera o necessário; os outros cedem a vez à reserva
+                for parte in self._chamar(modelo, messages, stop, kwargs, modo, None if ultimo else self.espera_maxima):
+                    emitiu = True
+                    yield parte
+                return
+            except Exception:
+                if emitiu or ultimo:
+                    raise
+                contar("llm_reserva")
+
+    def _executar(self, messages, stop, kwargs, modo):
+        chave = self._chave(messages, stop, kwargs, modo)
+        voo, primeiro = _entrar(chave)
+        if not primeiro:
+            contar("llm_coalescida")
+            yield from voo.acompanhar()
+            return
+        erro = None
+        try:
+            for parte in self._com_reserva(messages, stop, kwargs, modo):
+                voo.publicar(parte)
+                yield parte
+        except BaseException as e:
+            # Inclui o abandono do stream (GeneratorExit): quem acompanha não fica esperando
+            erro = e if isinstance(e, Exception) else RuntimeError("Chamada ao LLM interrompida")
+            raise
+        finally:
+            _sair(chave)
+            voo.concluir(erro)
+
+    def _generate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        # Consumido até o fim, para a chamada ser concluída para quem a acompanha
+        *_, mensagem = self._executar(messages, stop, kwargs, "invoke")
+        return ChatResult(generations=[ChatGeneration(message=mensagem)])
+
+    def _stream(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None,
+                **kwargs: Any):
+        for parte in self._executar(messages, stop, kwargs, "stream"):
+            yield ChatGenerationChunk(message=parte)
@@ -0,0 +1,243 @@
+"""Índice vetorial compacto e docstore mapeado em memória.
+
+O tipo do índice FAISS é escolhido por TIPO_INDICE:
+- "flat": vetores float32, busca exata (padrão, bom para poucos PDFs);
+- "flat16": vetores em float16, metade da memória, busca exata;
+- "ivf", "ivf16": listas invertidas (IVF) com vetores float32 ou float16;
+  a busca visita só INDICE_NPROBE listas;
+- "ivfpq": IVF com quantização por produto, ~1 byte a cada 8 dimensões.
+
+Os tipos IVF são treinados em uma amostra dos vetores. Na construção, a
+amostra são os primeiros AMOSTRA_TREINO vetores, e os demais lotes entram
+no índice já treinado à medida que são vetorizados. Com poucos vetores
+para treinar, o índice cai para o tipo plano equivalente.
+
+Todos os tipos guardam rótulos int64 estáveis (add_with_ids), então remover
+vetores não desloca os demais. O docstore e o mapa rótulo -> id são gravados
+à medida que os documentos chegam, em arquivos binários lidos com mmap: os
+processos não carregam os documentos na memória, só as páginas que cada
+busca toca.
+"""
+import json
+import math
+import os
+from collections.abc import Mapping
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+TIPO_INDICE = os.getenv("TIPO_INDICE", "flat")  # flat | flat16 | ivf | ivf16 | ivfpq
+NPROBE = int(os.getenv("INDICE_NPROBE", "16"))
+AMOSTRA_TREINO = int(os.getenv("INDICE_AMOSTRA_TREINO", "50000"))
+
+# O k-means do FAISS pede ao menos 39 pontos de treino por centróide
+PONTOS_POR_CENTROIDE = 39
+CENTROIDES_PQ = 256
+
+ARQUIVO_DOCUMENTOS = "documentos.bin"
+ARQUIVO_IDS = "documentos_ids.npy"
+ARQUIVO_POSICOES = "documentos_posicoes.npy"
+ARQUIVO_ROTULOS = "rotulos.npy"
+ARQUIVO_ROTULOS_IDS = "rotulos_ids.npy"
+
+
+# === Índice FAISS ===
+def descricao_indice(tipo, dimensao, total):
+    """String do index_factory do FAISS para o tipo e o número de vetores de treino."""
+    plano = "IDMap2,Flat" if tipo in ("flat", "ivf") else "IDMap2,SQfp16"
+    if tipo in ("flat", "flat16"):
+        return plano
+    if tipo not in ("ivf", "ivf16", "ivfpq"):
+        raise ValueError(f"TIPO_INDICE desconhecido: {tipo}")
+
+    listas = min(int(4 * math.sqrt(total)), total // PONTOS_POR_CENTROIDE)
+    if listas < 2:
+        return plano
+    if tipo == "ivf":
+        return f"IVF{listas},Flat"
+    if tipo == "ivfpq" and dimensao % 8 == 0 and total >= CENTROIDES_PQ * PONTOS_POR_CENTROIDE:
+        # "np" desliga o treino polissêmico, que multiplica o tempo de treino
+        return f"IVF{listas},PQ{dimensao // 8}x8np"
+    return f"IVF{listas},SQfp16"
+
+
+def descricao_para(dimensao, total, tipo=TIPO_INDICE, amostra=AMOSTRA_TREINO):
+    """Descrição que criar_index usaria para um índice com `total` vetores."""
+    return descricao_indice(tipo, dimensao, min(total, amostra))
+
+
+def criar_index(vetores, tipo=TIPO_INDICE, amostra=AMOSTRA_TREINO):
+    """Cria o índice vazio, já treinado em uma amostra de vetores (array float32)."""
+    if len(vetores) > amostra:
+        treino = vetores[np.random.default_rng(0).choice(len(vetores), amostra, replace=False)]
+    else:
+        treino = vetores
+    index = faiss.index_factory(vetores.shape[1], descricao_para(vetores.shape[1], len(vetores), tipo, amostra))
+    if not index.is_trained:
+        index.train(treino)
+    ajustar_nprobe(index)
+    return index
+
+
+def ajustar_nprobe(index, nprobe=NPROBE):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+
+
+def seletor_rotulos(rotulos):
+    """Seletor do FAISS que restringe a busca aos rótulos informados."""
+    return faiss.IDSelectorBatch(np.asarray(rotulos, dtype="int64"))
+
+
+def buscar_filtrado(index, vetores, k, seletor, disponiveis):
+    """index.search restrito ao seletor, com `disponiveis` rótulos selecionados.
+
+    No IVF, as nprobe listas visitadas podem ter menos de k vetores do
+    filtro: a busca é refeita com o dobro de listas até achar
+    min(k, disponiveis) vizinhos ou visitar todas as listas.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return index.search(vetores, k, params=faiss.SearchParameters(sel=seletor))
+    esperados, nprobe = min(k, disponiveis), ivf.nprobe
+    while True:
+        # O IVF recusa parâmetros genéricos e precisa receber o nprobe junto
+        distancias, indices = index.search(vetores, k, params=faiss.SearchParametersIVF(sel=seletor, nprobe=nprobe))
+        if nprobe >= ivf.nlist or (indices != -1).sum(axis=1).min() >= esperados:
+            return distancias, indices
+        nprobe = min(2 * nprobe, ivf.nlist)
+
+
+def precisa_treino(tipo=TIPO_INDICE):
+    """Os tipos IVF são treinados antes de receber vetores; os planos, não."""
+    return tipo in ("ivf", "ivf16", "ivfpq")
+
+
+# === Docstore em disco ===
+class EscritorDocstore:
+    """Grava o docstore e o mapa rótulo -> id à medida que os documentos chegam.
+
+    Os textos vão direto para documentos.bin; até fechar(), só os ids, as
+    posições e os rótulos ficam em memória.
+    """
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self._arquivo = open(os.path.join(diretorio, ARQUIVO_DOCUMENTOS), "wb")
+        self._tamanho = 0
+        self._ids, self._posicoes = [], []
+        self._rotulos, self._ids_rotulos = [], []
+        self._copiados = []  # (rótulos, ids) vindos da versão anterior
+
+    def _escrever(self, _id, bruto):
+        self._arquivo.write(bruto)
+        self._ids.append(_id)
+        self._posicoes.append((self._tamanho, self._tamanho + len(bruto)))
+        self._tamanho += len(bruto)
+
+    def adicionar(self, _id, doc, rotulo=None):
+        """Grava o documento; com rótulo, ele também entra no mapa do índice vetorial."""
+        bruto = json.dumps({"c": doc.page_content, "m": doc.metadata}, ensure_ascii=False).encode("utf-8")
+        self._escrever(_id.encode("utf-8"), bruto)
+        if rotulo is not None:
+            self._rotulos.append(rotulo)
+            self._ids_rotulos.append(_id.encode("utf-8"))
+
+    def copiar(self, anterior, excluir):
+        """Copia os documentos do docstore em `anterior`, menos os ids em `excluir`.
+
+        Os documentos são copiados em bytes, sem decodificar. Retorna os
+        rótulos dos documentos excluídos, a remover do índice vetorial.
+        """
+        excluir = np.array([_id.encode("utf-8") for _id in excluir], dtype=bytes)
+        ids = np.load(os.path.join(anterior, ARQUIVO_IDS), mmap_mode="r")
+        posicoes = np.load(os.path.join(anterior, ARQUIVO_POSICOES), mmap_mode="r")
+        dados = np.memmap(os.path.join(anterior, ARQUIVO_DOCUMENTOS), dtype=np.uint8, mode="r")
+        for i in np.flatnonzero(~np.isin(ids, excluir)):
+            inicio, fim = posicoes[i]
+            self._escrever(bytes(ids[i]), dados[inicio:fim].tobytes())
+
+        rotulos = np.load(os.path.join(anterior, ARQUIVO_ROTULOS))
+        ids_rotulos = np.load(os.path.join(anterior, ARQUIVO_ROTULOS_IDS))
+        excluidos = np.isin(ids_rotulos, excluir)
+        self._copiados.append((rotulos[~excluidos], ids_rotulos[~excluidos]))
+        return rotulos[excluidos]
+
+    def fechar(self):
+        """Grava os ids e os rótulos ordenados, para a busca binária do DocstoreMmap e do MapaRotulos."""
+        self._arquivo.close()
+        ids = np.array(self._ids, dtype=bytes)
+        ordem = np.argsort(ids, kind="stable")
+        np.save(os.path.join(self.diretorio, ARQUIVO_IDS), ids[ordem])
+        np.save(os.path.join(self.diretorio, ARQUIVO_POSICOES), np.array(self._posicoes, dtype="int64")[ordem])
+
+        rotulos = [rotulos for rotulos, _ in self._copiados] + [np.array(self._rotulos, dtype="int64")]
+        ids_rotulos = [ids for _, ids in self._copiados] + [np.array(self._ids_rotulos, dtype=bytes)]
+        rotulos, ids_rotulos = np.concatenate(rotulos), np.concatenate(ids_rotulos)
+        ordem = np.argsort(rotulos, kind="stable")
+        np.save(os.path.join(self.diretorio, ARQUIVO_ROTULOS), rotulos[ordem])
+        np.save(os.path.join(self.diretorio, ARQUIVO_ROTULOS_IDS), ids_rotulos[ordem])
+
+
+def proximo_rotulo(diretorio):
+    """Primeiro rótulo livre depois dos rótulos gravados no diretório."""
+    rotulos = np.load(os.path.join(diretorio, ARQUIVO_ROTULOS), mmap_mode="r")
+    return int(rotulos[-1]) + 1 if len(rotulos) else 0
+
+
+def procurar_ordenado(ordenados, chave):
+    """Posição de `chave` no array ordenado, ou None se ela não estiver lá."""
+    i = int(np.searchsorted(ordenados, chave))
+    return i if i < len(ordenados) and ordenados[i] == chave else None
+
+
+class DocstoreMmap(Docstore):
+    """Docstore somente leitura sobre os arquivos gravados por EscritorDocstore."""
+
+    def __init__(self, diretorio):
+        self._ids = np.load(os.path.join(diretorio, ARQUIVO_IDS), mmap_mode="r")
+        self._posicoes = np.load(os.path.join(diretorio, ARQUIVO_POSICOES), mmap_mode="r")
+        self._dados = np.memmap(os.path.join(diretorio, ARQUIVO_DOCUMENTOS), dtype=np.uint8, mode="r")
+
+    def _documento(self, i):
+        inicio, fim = self._posicoes[i]
+        bruto = self._dados[inicio:fim].tobytes()
+        registro = json.loads(bruto)
+        return Document(page_content=registro["c"], metadata=registro["m"])
+
+    def search(self, search):
+        i = procurar_ordenado(self._ids, search.encode("utf-8"))
+        # Mesmo contrato do InMemoryDocstore: id ausente devolve uma mensagem
+        return f"ID {search} not found." if i is None else self._documento(i)
+
+    def itens(self):
+        for i, _id in enumerate(self._ids):
+            yield _id.decode("utf-8"), self._documento(i)
+
+
+class MapaRotulos(Mapping):
+    """index_to_docstore_id somente leitura: rótulo do FAISS -> id no docstore."""
+
+    def __init__(self, diretorio):
+        self._rotulos = np.load(os.path.join(diretorio, ARQUIVO_ROTULOS), mmap_mode="r")
+        self._ids = np.load(os.path.join(diretorio, ARQUIVO_ROTULOS_IDS), mmap_mode="r")
+
+    def __getitem__(self, rotulo):
+        i = procurar_ordenado(self._rotulos, rotulo)
+        if i is None:
+            raise KeyError(rotulo)
+        return self._ids[i].decode("utf-8")
+
+    def __iter__(self):
+        return (int(rotulo) for rotulo in self._rotulos)
+
+    def __len__(self):
+        return len(self._rotulos)
+
+
+def carregar_docstore(diretorio):
+    """Retorna (docstore, index_to_docstore_id) somente leitura do diretório."""
+    return DocstoreMmap(diretorio), MapaRotulos(diretorio)
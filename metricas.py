@@ -0,0 +1,209 @@
+"""Medição das etapas do pipeline e exportação das métricas.
+
+Cada etapa (extração, divisão, vetorização, busca, montagem do contexto,
+geração...) é medida com etapa(), que registra o tempo de parede, as
+quantidades informadas (itens, bytes, tokens) e o erro, se houver.
+Eventos pontuais, como acertos e faltas de cache ou retentativas, são
+somados com contar().
+
+As medições ficam em um registro único por processo, exportado de três
+formas, todas opcionais:
+- um log JSON por linha para cada etapa (METRICAS_ARQUIVO_LOG);
+- um arquivo de texto no formato do Prometheus, para o textfile collector
+  do node_exporter (METRICAS_ARQUIVO_PROMETHEUS);
+- um endpoint HTTP /metrics (METRICAS_PORTA), só na interface local por
+  padrão (METRICAS_ENDERECO).
+As perguntas do chat recebem um id de rastro, repetido em todas as etapas
+da mesma pergunta no log.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ARQUIVO_LOG = os.getenv("METRICAS_ARQUIVO_LOG")
+ARQUIVO_PROMETHEUS = os.getenv("METRICAS_ARQUIVO_PROMETHEUS")
+PORTA = int(os.getenv("METRICAS_PORTA", "0"))
+# 0.0.0.0 expõe as métricas em todas as interfaces
+ENDERECO = os.getenv("METRICAS_ENDERECO", "127.0.0.1")
+# Durações guardadas por etapa para o cálculo dos percentis
+JANELA = 1000
+MEDIDAS = ("itens", "bytes", "tokens")
+PREFIXO = "chat_wiki"
+
+logger = logging.getLogger("chat_wiki.metricas")
+if ARQUIVO_LOG and not logger.handlers:
+    _handler = logging.FileHandler(ARQUIVO_LOG, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+_rastro = contextvars.ContextVar("rastro", default=None)
+
+
+def novo_rastro():
+    rastro = uuid.uuid4().hex[:12]
+    _rastro.set(rastro)
+    return rastro
+
+
+def _percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))]
+
+
+class Registro:
+    def __init__(self, janela=JANELA):
+        self._lock = threading.Lock()
+        self._duracoes = defaultdict(lambda: deque(maxlen=janela))
+        self._contagens = defaultdict(int)
+        self._somas = defaultdict(float)
+        self._erros = defaultdict(int)
+        self._medidas = defaultdict(lambda: dict.fromkeys(MEDIDAS, 0))
+        self._eventos = defaultdict(int)
+
+    def registrar(self, etapa, duracao, erro=None, **atributos):
+        with self._lock:
+            self._duracoes[etapa].append(duracao)
+            self._contagens[etapa] += 1
+            self._somas[etapa] += duracao
+            if erro is not None:
+                self._erros[etapa] += 1
+            for medida in MEDIDAS:
+                self._medidas[etapa][medida] += atributos.get(medida) or 0
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                "ts": round(time.time(), 3),
+                "rastro": _rastro.get(),
+                "etapa": etapa,
+                "duracao_ms": round(duracao * 1000, 3),
+                "erro": erro,
+                **atributos,
+            }, ensure_ascii=False, default=str))
+
+    def contar(self, evento, valor=1):
+        with self._lock:
+            self._eventos[evento] += valor
+
+    def resumo(self):
+        """{etapa: {n, p50_ms, p95_ms, media_ms, erros, itens, bytes, tokens}} e os eventos."""
+        with self._lock:
+            etapas = {}
+            for etapa, duracoes in self._duracoes.items():
+                ordenadas = sorted(duracoes)
+                etapas[etapa] = {
+                    "n": self._contagens[etapa],
+                    "p50_ms": _percentil(ordenadas, 50) * 1000,
+                    "p95_ms": _percentil(ordenadas, 95) * 1000,
+                    "media_ms": self._somas[etapa] / self._contagens[etapa] * 1000,
+                    "erros": self._erros[etapa],
+                    **self._medidas[etapa],
+                }
+            return {"etapas": etapas, "eventos": dict(self._eventos)}
+
+    def prometheus(self):
+        resumo = self.resumo()
+        linhas = [
+            f"# HELP {PREFIXO}_etapa_segundos Tempo de parede das etapas do pipeline.",
+            f"# TYPE {PREFIXO}_etapa_segundos summary",
+        ]
+        with self._lock:
+            somas = dict(self._somas)
+        for etapa, dados in sorted(resumo["etapas"].items()):
+            rotulo = f'etapa="{etapa}"'
+            linhas += [
+                f'{PREFIXO}_etapa_segundos{{{rotulo},quantile="0.5"}} {dados["p50_ms"] / 1000:.6f}',
+                f'{PREFIXO}_etapa_segundos{{{rotulo},quantile="0.95"}} {dados["p95_ms"] / 1000:.6f}',
+                f"{PREFIXO}_etapa_segundos_sum{{{rotulo}}} {somas[etapa]:.6f}",
+                f"{PREFIXO}_etapa_segundos_count{{{rotulo}}} {dados['n']}",
+            ]
+        for nome in ("erros",) + MEDIDAS:
+            linhas.append(f"# TYPE {PREFIXO}_etapa_{nome}_total counter")
+            linhas += [
+                f"{PREFIXO}_etapa_{nome}_total{{etapa=\"{etapa}\"}} {dados[nome]}"
+                for etapa, dados in sorted(resumo["etapas"].items())
+            ]
+        linhas.append(f"# TYPE {PREFIXO}_eventos_total counter")
+        linhas += [
+            f'{PREFIXO}_eventos_total{{evento="{evento}"}} {valor}'
+            for evento, valor in sorted(resumo["eventos"].items())
+        ]
+        return "\n".join(linhas) + "\n"
+
+
+REGISTRO = Registro()
+
+
+def registrar(etapa, duracao, erro=None, **atributos):
+    """Registra uma etapa medida fora de etapa(), por exemplo em outro processo."""
+    REGISTRO.registrar(etapa, duracao, erro, **atributos)
+
+
+def contar(evento, valor=1):
+    if valor:
+        REGISTRO.contar(evento, valor)
+
+
+@contextmanager
+def etapa(nome, **atributos):
+    """Mede o bloco; o dicionário devolvido recebe itens, bytes, tokens e outros atributos."""
+    medicao = dict(atributos)
+    inicio = time.perf_counter()
+    erro = None
+    try:
+        yield medicao
+    except Exception as e:
+        erro = type(e).__name__
+        raise
+    finally:
+        REGISTRO.registrar(nome, time.perf_counter() - inicio, erro, **medicao)
+
+
+def resumo():
+    return REGISTRO.resumo()
+
+
+def gravar_prometheus(caminho=ARQUIVO_PROMETHEUS):
+    if not caminho:
+        return
+    # Escrita atômica: o coletor nunca lê um arquivo pela metade
+    temporario = f"{caminho}.tmp-{os.getpid()}"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(REGISTRO.prometheus())
+    os.replace(temporario, caminho)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        corpo = REGISTRO.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_servidor(porta=PORTA, endereco=ENDERECO):
+    """Sobe o endpoint /metrics em uma thread; sem porta configurada, não faz nada."""
+    if not porta:
+        return None
+    try:
+        servidor = ThreadingHTTPServer((endereco, porta), _Handler)
+    except OSError as e:
+        # Porta ocupada (outro processo já exporta /metrics): o chat segue sem o endpoint
+        logging.getLogger(__name__).warning("Endpoint /metrics não iniciado em %s:%s: %s", endereco, porta, e)
+        return None
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="metricas").start()
+    return servidor
@@ -0,0 +1,271 @@
+"""Rascunho de fichas de indicador e de programa, gerado em paralelo.
+
+Em vez de uma única geração longa com a ficha inteira, os campos da ficha
+são divididos em grupos pequenos. Cada grupo busca no PDF modelo as
+orientações de preenchimento dos seus campos, com um orçamento de contexto
+por campo, e é gerado com um prompt curto; todos os grupos rodam ao mesmo
+tempo: o tempo total fica próximo ao do grupo mais
+lento, e não à soma de todos. As seções são devolvidas à medida que ficam
+prontas e montadas na ordem da ficha.
+
+Os campos são lidos dos modelos da Wiki. No PDF da ficha de indicador, o
+bloco de cada campo termina com o ícone de edição, e a linha seguinte é o
+título do próximo campo, aceito só quando corresponde a um campo conhecido
+da ficha (o ícone também aparece depois de notas e avisos). A Ficha de
+Programa.pdf é uma impressão sem texto extraível: os campos e as
+orientações de cada um vêm da transcrição em Ficha de Programa.md. Sem
+modelo legível, o rascunho da ficha é recusado.
+
+O nome do indicador é um grupo próprio, gerado com as regras do protocolo
+de nomeação e conferido por aplicar_protocolo.
+"""
+import contextvars
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from contexto import estimar_tokens, montar_contexto
+from divisao_estruturada import TAMANHO_MAXIMO_PAI, limpar_linha
+from metricas import etapa
+from prompts import PROMPT_CAMPOS_FICHA, PROMPT_NOME_INDICADOR
+from recuperacao import RetrieverHibrido, sem_acentos
+from resposta import concluir
+from roteador import FICHA_INDICADOR, FICHA_PROGRAMA, PROTOCOLO
+
+CAMPOS_POR_GRUPO = int(os.getenv("FICHA_CAMPOS_POR_GRUPO", "3"))
+# Orçamento de cada campo: cabe uma seção pai inteira, e as orientações de
+# um campo não tiram o lugar das dos outros campos do grupo
+ORCAMENTO_CAMPO_TOKENS = estimar_tokens(" " * TAMANHO_MAXIMO_PAI)
+TRECHOS_POR_CAMPO = 2
+
+Ficha = namedtuple("Ficha", "nome pdf campo_nome campos_padrao modelo")
+Grupo = namedtuple("Grupo", "campos nome")
+
+MODELO_FICHA_PROGRAMA = "Ficha de Programa.md"
+
+FICHAS = {
+    "ficha_indicador": Ficha("ficha de indicador", FICHA_INDICADOR, "Nome do Indicador", (
+        "Descrição e Interpretação",
+        "Unidade de Medida",
+        "Domínio (Intervalo de Valores Possíveis)",
+        "Nível de Publicização do Indicador",
+        "Fonte(s) de Dados para o Cálculo do Indicador",
+        "Data a partir da qual é possível calcular o indicador",
+        "Periodicidade de Atualização",
+        "Níveis de Desagregação Territorial",
+        "Metodologia (Fórmula de Cálculo)",
+        "Autoria do Método",
+        "Informações Complementares",
+        "Informações sobre a sintaxe de cálculo do indicador",
+    ), None),
+    # Campos e orientações vêm da transcrição do modelo (o PDF não tem texto)
+    "ficha_programa": Ficha("ficha de programa", FICHA_PROGRAMA, "Nome do Programa", (), MODELO_FICHA_PROGRAMA),
+}
+
+SEM_MODELO = (
+    "⚠️ Não é possível propor uma {nome}: o modelo da ficha não foi encontrado ou não tem campos legíveis. "
+    "Consulte o modelo na Documenta Wiki ou pergunte sobre campos específicos."
+)
+AVISO = (
+    "⚠️ Esta proposta pode conter erros e deve ser revisada com atenção pelo ponto focal antes de ser "
+    "transportada para a Documenta Wiki."
+)
+
+# Ícone de edição (uso privado) no fim do bloco de cada campo
+_FIM_DE_CAMPO = re.compile(r"[\U000f0000-\U0010ffff]\s*$")
+
+
+def _compactar(texto):
+    # A extração quebra palavras ("Interpr etação"): compara só letras e dígitos
+    return re.sub(r"[^a-z0-9]", "", sem_acentos(texto.lower()))
+
+
+@lru_cache(maxsize=None)
+def orientacoes_do_modelo(caminho):
+    """{campo: orientação} da transcrição de um modelo da Wiki, na ordem da ficha.
+
+    Cada título "##" ou "###" seguido de texto é um campo; títulos sem texto
+    só agrupam campos.
+    """
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            linhas = f.read().splitlines()
+    except OSError:
+        return {}
+    campos, atual = {}, None
+    for linha in linhas:
+        titulo = re.match(r"#{2,3}\s+(.+)", linha)
+        if titulo:
+            atual = titulo.group(1).strip()
+            campos[atual] = []
+        elif atual is not None and linha.strip():
+            campos[atual].append(linha.strip())
+    return {campo: "\n".join(texto) for campo, texto in campos.items() if texto}
+
+
+@lru_cache(maxsize=None)
+def campos_da_ficha(intencao):
+    """Campos da ficha, na ordem do modelo, sem o campo do nome; vazio sem modelo legível."""
+    ficha = FICHAS[intencao]
+    if ficha.modelo is not None:
+        return tuple(campo for campo in orientacoes_do_modelo(ficha.modelo) if campo != ficha.campo_nome)
+    try:
+        linhas = [
+            linha for pagina in PdfReader(ficha.pdf).pages for linha in (pagina.extract_text() or "").splitlines()
+        ]
+    except OSError:
+        linhas = []
+
+    grafia = {_compactar(campo): campo for campo in ficha.campos_padrao}
+    campos = []
+    for anterior, linha in zip(linhas, linhas[1:]):
+        campo = grafia.get(_compactar(limpar_linha(linha)))
+        if _FIM_DE_CAMPO.search(anterior) and campo is not None and campo not in campos:
+            campos.append(campo)
+    return tuple(campos) if len(campos) > 1 else ficha.campos_padrao
+
+
+def grupos_da_ficha(intencao, campos_por_grupo=CAMPOS_POR_GRUPO):
+    ficha = FICHAS[intencao]
+    campos = campos_da_ficha(intencao)
+    # O nome do indicador segue o protocolo de nomeação e tem grupo próprio
+    if intencao == "ficha_indicador":
+        grupos = [Grupo((ficha.campo_nome,), True)]
+    else:
+        campos = (ficha.campo_nome,) + campos
+        grupos = []
+    grupos += [Grupo(campos[i:i + campos_por_grupo], False) for i in range(0, len(campos), campos_por_grupo)]
+    return grupos
+
+
+# === Protocolo de nomeação ===
+REPRESENTACOES = {
+    "numero": "número", "percentual": "percentual", "reais": "reais", "anos": "anos", "meses": "meses",
+    "dias": "dias", "categoria": "categoria", "quilogramas": "quilogramas", "toneladas": "toneladas",
+    "litros": "litros",
+}
+TEMPORALIDADES = ("no ano", "anual", "semestral", "trimestral", "bimestral")
+PALAVRAS_NOME = 15
+
+
+def aplicar_protocolo(nome):
+    """Ajusta o nome proposto às regras do protocolo; retorna (nome no formato da Wiki, avisos)."""
+    linhas = [linha for linha in nome.splitlines() if linha.strip()]
+    nome = linhas[0] if linhas else ""
+    nome = re.sub(r"^\W*(nome do indicador\s*:)?\s*(IN\s*#*\d*\s*-\s*)?", "", nome.strip(" *\"'"), flags=re.I)
+    partes = [parte.strip() for parte in nome.strip(" *\"'.").split(",") if parte.strip()]
+    avisos = []
+
+    # Indicadores mensais, o padrão do MDS, não levam temporalidade no nome
+    if any(sem_acentos(parte.lower()) == "mensal" for parte in partes):
+        partes = [parte for parte in partes if sem_acentos(parte.lower()) != "mensal"]
+        avisos.append("A temporalidade \"mensal\" foi retirada: é o padrão e não entra no nome.")
+
+    representacao = REPRESENTACOES.get(sem_acentos(partes[-1].lower())) if len(partes) > 1 else None
+    if representacao is None:
+        avisos.append("Falta a representação no fim do nome, separada por vírgula (número, percentual, reais...).")
+    else:
+        # A temporalidade, quando houver, vem logo antes da representação
+        partes = partes[:-1]
+        temporais = [parte for parte in partes if parte.lower() in TEMPORALIDADES]
+        partes = [parte for parte in partes if parte.lower() not in TEMPORALIDADES] + temporais + [representacao]
+
+    nome = ", ".join(partes)
+    palavras = len(nome.replace(",", " ").split())
+    if palavras > PALAVRAS_NOME:
+        avisos.append(
+            f"O nome tem {palavras} palavras; o protocolo admite até {PALAVRAS_NOME} (use a sigla oficial do programa)."
+        )
+    avisos.append("O nome deve ser validado em conjunto com o DMA.")
+    return f"IN### - {nome}", avisos
+
+
+# === Geração ===
+def _orientacoes(retriever, campos, nome):
+    # Uma busca por campo, cada uma no seu orçamento; o nome do indicador
+    # busca as regras do protocolo
+    consultas = ["estrutura geral do nome do indicador e representação"] if nome else list(campos)
+    contexto = []
+    for consulta in consultas:
+        for doc in montar_contexto(retriever.invoke(consulta), ORCAMENTO_CAMPO_TOKENS):
+            # Uma seção que orienta dois campos entra uma vez só
+            if doc not in contexto:
+                contexto.append(doc)
+    return contexto
+
+
+def _orientacoes_do_modelo(ficha, campos):
+    # Orientações transcritas do modelo, uma por campo, exibidas como trechos usados
+    orientacoes = orientacoes_do_modelo(ficha.modelo)
+    return [
+        Document(page_content=f"{campo}: {orientacoes[campo]}", metadata={"source": ficha.modelo})
+        for campo in campos
+        if campo in orientacoes
+    ]
+
+
+def _gerar_grupo(intencao, grupo, pergunta, llm, vectors, bm25):
+    ficha = FICHAS[intencao]
+    with etapa("ficha_grupo", campos=len(grupo.campos)) as medicao:
+        if ficha.modelo is not None:
+            contexto = _orientacoes_do_modelo(ficha, grupo.campos)
+        else:
+            # Os campos buscam no PDF modelo; o nome, nas regras do protocolo
+            fontes = [PROTOCOLO] if grupo.nome else [ficha.pdf]
+            retriever = RetrieverHibrido(vectors=vectors, bm25=bm25, fontes=fontes, k=TRECHOS_POR_CAMPO)
+            contexto = _orientacoes(retriever, grupo.campos, grupo.nome)
+        orientacoes = "\n\n".join(doc.page_content for doc in contexto) or "(sem orientações na base)"
+        if grupo.nome:
+            mensagens = PROMPT_NOME_INDICADOR.format_messages(orientacoes=orientacoes, pergunta=pergunta)
+        else:
+            mensagens = PROMPT_CAMPOS_FICHA.format_messages(
+                ficha=ficha.nome, campos="; ".join(grupo.campos), orientacoes=orientacoes, pergunta=pergunta
+            )
+        texto = llm.invoke(mensagens).content.strip()
+        medicao["itens"] = len(contexto)
+
+    if grupo.nome:
+        nome, avisos = aplicar_protocolo(texto)
+        texto = f"### {ficha.campo_nome}\n{nome}\n\n" + "\n>\n".join(f"> {aviso}" for aviso in avisos)
+    return texto, contexto
+
+
+def gerar_ficha(intencao, pergunta, llm, vectors, bm25, tempos, trabalhadores=None):
+    """Gera os grupos em paralelo e devolve (índice do grupo, seção, contexto) à medida que ficam prontos.
+
+    Sem trabalhadores, todos os grupos rodam ao mesmo tempo; o gateway do
+    LLM limita a concorrência real.
+    """
+    grupos = grupos_da_ficha(intencao)
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=trabalhadores or len(grupos)) as executor:
+        # Cada grupo leva o contexto da pergunta (rastro das métricas)
+        futuros = {
+            executor.submit(
+                contextvars.copy_context().run, _gerar_grupo, intencao, grupo, pergunta, llm, vectors, bm25
+            ): i
+            for i, grupo in enumerate(grupos)
+        }
+        for futuro in as_completed(futuros):
+            try:
+                secao, contexto = futuro.result()
+            except Exception:
+                # Um grupo com erro não derruba a ficha: os campos ficam pendentes
+                campos = grupos[futuros[futuro]].campos
+                secao = "\n\n".join(f"### {campo}\n[não foi possível gerar este campo; tente de novo]" for campo in campos)
+                contexto = []
+            if tempos["primeiro_token"] is None:
+                tempos["primeiro_token"] = time.perf_counter() - inicio
+            yield futuros[futuro], secao, contexto
+    tempos["geracao"] = time.perf_counter() - inicio
+    concluir(tempos)
+
+
+def montar_ficha(intencao, secoes):
+    return f"## Proposta de {FICHAS[intencao].nome}\n\n" + "\n\n".join(secoes) + f"\n\n{AVISO}"
@@ -0,0 +1,464 @@
+"""Recuperação híbrida: BM25 local + busca vetorial FAISS, fundidas por RRF.
+
+O índice BM25 é um índice invertido sobre os mesmos trechos do FAISS,
+com um segmento por PDF para permitir buscas em sub-índices e
+atualizações que só refazem os PDFs alterados, e tokenização em
+português usando o modelo punkt incluído em nltk_data/. Ele é gravado com
+cada versão do índice e lido com mmap.
+No modo "lexical" a busca não faz nenhuma chamada de rede; no modo
+"hibrido", se a busca vetorial falhar ou passar do tempo limite, o
+resultado lexical é usado sozinho. O embedding da pergunta é calculado uma
+vez só (VetorConsulta), com uma tentativa e um prazo único de
+TEMPO_LIMITE_VETORIAL segundos, e reaproveitado pelo cache de respostas e
+pela busca. Os trechos encontrados que têm uma
+seção pai no docstore são trocados por ela antes de sair do retriever.
+"""
+import contextvars
+import hashlib
+import heapq
+import json
+import math
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+import numpy as np
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from nltk.tokenize import NLTKWordTokenizer
+
+from indice_vetorial import buscar_filtrado, procurar_ordenado, seletor_rotulos
+from metricas import contar, etapa
+
+MODO_BUSCA = os.getenv("MODO_BUSCA", "hibrido")  # hibrido | vetorial | lexical
+TEMPO_LIMITE_VETORIAL = float(os.getenv("TEMPO_LIMITE_VETORIAL", "3"))
+
+CAMINHO_PUNKT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "nltk_data", "tokenizers", "punkt", "PY3", "portuguese.pickle"
+)
+
+STOPWORDS = set("""
+a ao aos as com como da das de do dos e em entre essa esse esta este eu ha isso
+ja mais mas me mesmo na nas nem no nos o os ou para pela pelas pelo pelos por
+qual quando que se sem ser seu sua sao tambem te tem um uma umas uns voce
+""".split())
+
+_executor = ThreadPoolExecutor(max_workers=4)
+# Separado do _executor: chamadas presas à API não ocupam as buscas
+_executor_embeddings = ThreadPoolExecutor(max_workers=4, thread_name_prefix="embedding_consulta")
+
+
+# === Tokenização ===
+def _carregar_punkt():
+    # O pickle incluído no repositório funciona em qualquer versão do nltk,
+    # inclusive nas que não trazem mais o recurso "punkt" por padrão
+    with open(CAMINHO_PUNKT, "rb") as f:
+        return pickle.load(f)
+
+
+_punkt = _carregar_punkt()
+_palavras = NLTKWordTokenizer()
+
+
+def sem_acentos(texto):
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def dividir_frases(texto):
+    return _punkt.tokenize(texto)
+
+
+def tokenizar(texto):
+    tokens = []
+    for frase in dividir_frases(texto):
+        for token in _palavras.tokenize(frase):
+            token = sem_acentos(token.lower())
+            if re.fullmatch(r"\w+", token) and len(token) > 1 and token not in STOPWORDS:
+                tokens.append(token)
+    return tokens
+
+
+# === Índice BM25 ===
+ARQUIVO_BM25 = "bm25.json"
+DIRETORIO_SEGMENTOS = "bm25"
+ARRAYS_SEGMENTO = ("termos", "inicios", "docs", "tfs", "tamanhos", "rotulos")
+ARRAYS_VOCABULARIO = ("termos", "df")
+K1_BM25 = 1.5
+B_BM25 = 0.75
+
+
+def nome_segmento(fonte):
+    return hashlib.sha256(fonte.encode("utf-8")).hexdigest()[:16]
+
+
+def _ler_arrays(prefixo, nomes):
+    return {nome: np.load(f"{prefixo}{nome}.npy", mmap_mode="r") for nome in nomes}
+
+
+def _gravar_arrays(prefixo, arrays):
+    for nome, array in arrays.items():
+        np.save(f"{prefixo}{nome}.npy", array)
+
+
+def _somar_df(partes):
+    """Soma os vocabulários [(termos, df)]; df negativo subtrai, e termos que zeram saem."""
+    partes = [(termos, df) for termos, df in partes if len(termos)]
+    if not partes:
+        return np.zeros(0, dtype=bytes), np.zeros(0, dtype="int64")
+    unicos, posicoes = np.unique(np.concatenate([termos for termos, _ in partes]), return_inverse=True)
+    soma = np.bincount(posicoes, weights=np.concatenate([df for _, df in partes]), minlength=len(unicos))
+    soma = np.rint(soma).astype("int64")
+    return unicos[soma > 0], soma[soma > 0]
+
+
+class ConstrutorBM25:
+    """Grava o índice BM25 de uma versão, um segmento por PDF.
+
+    Os trechos chegam com adicionar(), com os de cada PDF em sequência; o
+    segmento de um PDF é gravado quando chegam os trechos do próximo, então
+    só as postings de um PDF ficam em memória. Os PDFs que não mudaram
+    desde a versão `anterior` entram com manter(): o segmento é ligado
+    (hard link) de lá, sem ser lido nem reconstruído. O vocabulário global
+    (df de cada termo) é o da versão anterior, menos os segmentos que
+    saíram e mais os novos.
+    """
+
+    def __init__(self, diretorio, anterior=None):
+        self.diretorio = diretorio
+        self.anterior = anterior
+        self._fontes = {}  # fonte -> {"segmento", "docs", "tokens"}
+        self._mantidas = set()
+        self._novos_df = []
+        self._anteriores = {}
+        if anterior is not None:
+            with open(os.path.join(anterior, ARQUIVO_BM25), encoding="utf-8") as f:
+                self._anteriores = json.load(f)["fontes"]
+        self._fonte = None
+        self._rotulos, self._frequencias = [], []
+        os.makedirs(os.path.join(diretorio, DIRETORIO_SEGMENTOS), exist_ok=True)
+
+    def adicionar(self, fonte, rotulo, texto):
+        if fonte != self._fonte:
+            self._gravar_segmento()
+            self._fonte = fonte
+        self._rotulos.append(rotulo)
+        self._frequencias.append(Counter(tokenizar(texto)))
+
+    def manter(self, fonte):
+        """Reaproveita o segmento da fonte na versão anterior, se houver."""
+        info = self._anteriores.get(fonte)
+        if info is None:
+            return
+        origem = os.path.join(self.anterior, DIRETORIO_SEGMENTOS, info["segmento"])
+        destino = os.path.join(self.diretorio, DIRETORIO_SEGMENTOS, info["segmento"])
+        os.makedirs(destino)
+        for nome in os.listdir(origem):
+            try:
+                os.link(os.path.join(origem, nome), os.path.join(destino, nome))
+            except OSError:
+                # Sistema de arquivos sem hard link: copia
+                shutil.copyfile(os.path.join(origem, nome), os.path.join(destino, nome))
+        self._fontes[fonte] = info
+        self._mantidas.add(fonte)
+
+    def fechar(self):
+        self._gravar_segmento()
+        partes = list(self._novos_df)
+        if self.anterior is not None:
+            vocabulario = _ler_arrays(os.path.join(self.anterior, "bm25_"), ARRAYS_VOCABULARIO)
+            partes.append((vocabulario["termos"], vocabulario["df"]))
+            # Segmentos da versão anterior que não foram mantidos saem do df
+            for fonte, info in self._anteriores.items():
+                if fonte not in self._mantidas:
+                    termos, df = self._df_segmento(os.path.join(self.anterior, DIRETORIO_SEGMENTOS, info["segmento"]))
+                    partes.append((termos, -df))
+        termos, df = _somar_df(partes)
+        _gravar_arrays(os.path.join(self.diretorio, "bm25_"), {"termos": termos, "df": df})
+        with open(os.path.join(self.diretorio, ARQUIVO_BM25), "w", encoding="utf-8") as f:
+            json.dump({"fontes": self._fontes}, f, ensure_ascii=False)
+
+    @staticmethod
+    def _df_segmento(diretorio):
+        segmento = _ler_arrays(os.path.join(diretorio, ""), ("termos", "inicios"))
+        return segmento["termos"], np.diff(segmento["inicios"])
+
+    def _gravar_segmento(self):
+        if not self._rotulos:
+            return
+        postings = defaultdict(list)
+        for i, frequencias in enumerate(self._frequencias):
+            for termo, tf in frequencias.items():
+                postings[termo].append((i, tf))
+        termos = sorted(postings)
+        inicios = np.zeros(len(termos) + 1, dtype="int64")
+        inicios[1:] = np.cumsum([len(postings[termo]) for termo in termos])
+        arrays = {
+            "termos": np.array([termo.encode("utf-8") for termo in termos], dtype=bytes),
+            "inicios": inicios,
+            # docs: posição do trecho no segmento, que indexa tamanhos e rotulos
+            "docs": np.array([i for termo in termos for i, _ in postings[termo]], dtype="int32"),
+            "tfs": np.array([tf for termo in termos for _, tf in postings[termo]], dtype="float32"),
+            "tamanhos": np.array([sum(f.values()) for f in self._frequencias], dtype="float32"),
+            "rotulos": np.array(self._rotulos, dtype="int64"),
+        }
+        segmento = nome_segmento(self._fonte)
+        destino = os.path.join(self.diretorio, DIRETORIO_SEGMENTOS, segmento)
+        os.makedirs(destino)
+        _gravar_arrays(os.path.join(destino, ""), arrays)
+        self._fontes[self._fonte] = {
+            "segmento": segmento, "docs": len(self._rotulos), "tokens": float(arrays["tamanhos"].sum()),
+        }
+        self._novos_df.append((arrays["termos"], np.diff(inicios)))
+        self._rotulos, self._frequencias = [], []
+
+
+class IndiceBM25:
+    """Índice invertido BM25 em arrays do numpy, um segmento por PDF.
+
+    Cada segmento tem o vocabulário e as postings (trecho, tf) de um PDF: a
+    busca restrita a alguns PDFs só percorre os segmentos deles, e a
+    atualização incremental só regrava os segmentos dos PDFs alterados. O
+    df de cada termo, o número de trechos e o tamanho médio são do corpus
+    inteiro, e a normalização pelo tamanho do trecho é feita na busca. O
+    índice guarda apenas os rótulos FAISS dos trechos; os documentos são
+    lidos do docstore do índice vetorial só para os resultados. Gravados
+    na pasta da versão do índice, os arrays são lidos com mmap, como o
+    docstore.
+    """
+
+    def __init__(self, vectors, fontes, segmentos, vocabulario, k1=K1_BM25, b=B_BM25):
+        self.vectors = vectors
+        self.fontes = list(fontes)
+        self._indice_fonte = {fonte: i for i, fonte in enumerate(self.fontes)}
+        self._segmentos = segmentos
+        self.termos, self.df = vocabulario["termos"], vocabulario["df"]
+        self.k1, self.b = k1, b
+        self.total_docs = sum(info["docs"] for info in fontes.values())
+        self.media_tamanho = sum(info["tokens"] for info in fontes.values()) / max(self.total_docs, 1) or 1.0
+        self._seletores = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def carregar(cls, diretorio, vectors):
+        with open(os.path.join(diretorio, ARQUIVO_BM25), encoding="utf-8") as f:
+            fontes = json.load(f)["fontes"]
+        segmentos = [
+            _ler_arrays(os.path.join(diretorio, DIRETORIO_SEGMENTOS, info["segmento"], ""), ARRAYS_SEGMENTO)
+            for info in fontes.values()
+        ]
+        return cls(vectors, fontes, segmentos, _ler_arrays(os.path.join(diretorio, "bm25_"), ARRAYS_VOCABULARIO))
+
+    def _indices_fontes(self, fontes):
+        return [self._indice_fonte[fonte] for fonte in fontes if fonte in self._indice_fonte]
+
+    def rotulos_das_fontes(self, fontes):
+        """Rótulos FAISS dos trechos das fontes, para a busca vetorial em sub-índice."""
+        indices = self._indices_fontes(fontes)
+        if not indices:
+            return np.zeros(0, dtype="int64")
+        return np.concatenate([self._segmentos[f]["rotulos"] for f in indices])
+
+    def seletor_das_fontes(self, fontes):
+        """(seletor do FAISS, total de rótulos) das fontes, criado uma vez por conjunto de fontes."""
+        chave = frozenset(fontes)
+        with self._lock:
+            if chave not in self._seletores:
+                rotulos = self.rotulos_das_fontes(sorted(chave))
+                self._seletores[chave] = (seletor_rotulos(rotulos), len(rotulos))
+            return self._seletores[chave]
+
+    def buscar(self, consulta, k=4, fontes=None):
+        """Retorna [(documento, pontuação)] dos k melhores trechos, opcionalmente só de algumas fontes.
+
+        A pontuação só percorre as postings dos termos da consulta: o custo
+        depende dos trechos que contêm os termos, não do tamanho do corpus.
+        """
+        selecionados = range(len(self.fontes)) if fontes is None else self._indices_fontes(fontes)
+        rotulos, pesos = [], []
+        for termo in set(tokenizar(consulta)):
+            chave = termo.encode("utf-8")
+            g = procurar_ordenado(self.termos, chave)
+            if g is None:
+                continue
+            df = float(self.df[g])
+            idf = math.log(1 + (self.total_docs - df + 0.5) / (df + 0.5))
+            for f in selecionados:
+                segmento = self._segmentos[f]
+                t = procurar_ordenado(segmento["termos"], chave)
+                if t is None:
+                    continue
+                inicio, fim = segmento["inicios"][t], segmento["inicios"][t + 1]
+                docs, tf = segmento["docs"][inicio:fim], segmento["tfs"][inicio:fim]
+                norma = self.k1 * (1 - self.b + self.b * segmento["tamanhos"][docs] / self.media_tamanho)
+                rotulos.append(segmento["rotulos"][docs])
+                pesos.append(idf * tf * (self.k1 + 1) / (tf + norma))
+        if not rotulos:
+            return []
+
+        # Soma por trecho só sobre os candidatos encontrados nas postings
+        candidatos, posicoes = np.unique(np.concatenate(rotulos), return_inverse=True)
+        pontuacoes = np.bincount(posicoes, weights=np.concatenate(pesos))
+        melhores = np.argsort(-pontuacoes, kind="stable")[:k]
+        return [(self._documento(candidatos[i]), float(pontuacoes[i])) for i in melhores]
+
+    def _documento(self, rotulo):
+        return self.vectors.docstore.search(self.vectors.index_to_docstore_id[int(rotulo)])
+
+
+# === Embedding da pergunta ===
+class VetorConsulta:
+    """Embedding de uma pergunta, pedido na primeira leitura e calculado uma vez só.
+
+    Criar o objeto não chama a API: uma pergunta respondida pelo texto
+    exato no cache de respostas não paga o embedding. O prazo conta a
+    partir do pedido e vale para todas as leituras: se a API não responder
+    em tempo_limite segundos, obter() lança TimeoutError na hora para quem
+    vier depois, sem esperar de novo.
+    """
+
+    def __init__(self, embeddings, consulta, tempo_limite=TEMPO_LIMITE_VETORIAL):
+        self.consulta = consulta
+        self.embeddings = embeddings
+        self.tempo_limite = tempo_limite
+        self._prazo = None
+        self._futuro = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _calcular(embeddings, consulta):
+        with etapa("embedding_consulta"):
+            return np.asarray(embeddings.embed_query(consulta), dtype="float32")
+
+    def iniciar(self):
+        with self._lock:
+            if self._futuro is None:
+                self._prazo = time.monotonic() + self.tempo_limite
+                self._futuro = _executor_embeddings.submit(
+                    contextvars.copy_context().run, self._calcular, self.embeddings, self.consulta
+                )
+        return self._futuro
+
+    def obter(self):
+        futuro = self.iniciar()
+        try:
+            return futuro.result(timeout=max(0.0, self._prazo - time.monotonic()))
+        except TimeoutError:
+            contar("embedding_consulta_tempo_esgotado")
+            raise
+
+
+# === Fusão por posição recíproca (RRF) ===
+def _chave(doc):
+    return doc.metadata.get("source"), doc.metadata.get("page"), doc.page_content
+
+
+def fundir_rrf(listas, k=4, constante=60):
+    pontuacoes = defaultdict(float)
+    documentos = {}
+    for lista in listas:
+        for posicao, doc in enumerate(lista):
+            chave = _chave(doc)
+            pontuacoes[chave] += 1.0 / (constante + posicao + 1)
+            documentos.setdefault(chave, doc)
+    melhores = heapq.nlargest(k, pontuacoes.items(), key=lambda item: item[1])
+    return [documentos[chave] for chave, _ in melhores]
+
+
+# === Retriever híbrido ===
+class RetrieverHibrido(BaseRetriever):
+    vectors: Any
+    bm25: IndiceBM25
+    modo: str = MODO_BUSCA
+    fontes: Optional[List[str]] = None
+    k: int = 4
+    k_candidatos: int = 20
+    tempo_limite: float = TEMPO_LIMITE_VETORIAL
+    expandir_pais: bool = True
+    # Embedding da mesma pergunta já pedido por quem chama (ver VetorConsulta)
+    vetor_consulta: Optional[VetorConsulta] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _busca_lexical(self, consulta):
+        with etapa("busca_lexical") as medicao:
+            resultado = [doc for doc, _ in self.bm25.buscar(consulta, k=self.k_candidatos, fontes=self.fontes)]
+            medicao["itens"] = len(resultado)
+        return resultado
+
+    def _busca_vetorial(self, consulta):
+        # Sub-índice: o FAISS só compara a consulta com os vetores das fontes escolhidas
+        seletor = None
+        if self.fontes is not None:
+            seletor, disponiveis = self.bm25.seletor_das_fontes(self.fontes)
+            if not disponiveis:
+                return []
+
+        vetor_consulta = self.vetor_consulta
+        if vetor_consulta is None or vetor_consulta.consulta != consulta:
+            vetor_consulta = VetorConsulta(self.vectors.embeddings, consulta, self.tempo_limite)
+        vetor = vetor_consulta.obter()[np.newaxis, :]
+        with etapa("busca_faiss") as medicao:
+            if seletor is None:
+                _, indices = self.vectors.index.search(vetor, self.k_candidatos)
+            else:
+                _, indices = buscar_filtrado(self.vectors.index, vetor, self.k_candidatos, seletor, disponiveis)
+            resultado = [
+                self.vectors.docstore.search(self.vectors.index_to_docstore_id[i])
+                for i in indices[0]
+                if i != -1
+            ]
+            medicao["itens"] = len(resultado)
+        return resultado
+
+    def _expandir(self, docs):
+        """Troca cada trecho filho pela sua seção pai, sem repetir seções."""
+        expandidos, vistos = [], set()
+        for doc in docs:
+            id_pai = doc.metadata.get("pai")
+            if id_pai is not None:
+                if id_pai in vistos:
+                    continue
+                vistos.add(id_pai)
+                pai = self.vectors.docstore.search(id_pai)
+                if isinstance(pai, Document):
+                    doc = pai
+            expandidos.append(doc)
+        return expandidos
+
+    def _buscar(self, consulta):
+        if self.modo == "lexical":
+            return self._busca_lexical(consulta)
+        if self.modo == "vetorial":
+            return self._busca_vetorial(consulta)
+
+        # As duas buscas rodam em paralelo; a vetorial depende da API de embeddings
+        # O contexto é copiado para a thread manter o id de rastro da pergunta
+        futuro = _executor.submit(contextvars.copy_context().run, self._busca_vetorial, consulta)
+        lexicais = self._busca_lexical(consulta)
+        try:
+            vetoriais = futuro.result(timeout=self.tempo_limite)
+        except Exception:
+            # API lenta ou fora do ar: responde só com o resultado lexical
+            contar("busca_vetorial_descartada")
+            return lexicais
+        return fundir_rrf([vetoriais, lexicais], k=self.k_candidatos)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        candidatos = self._buscar(query)
+        if self.expandir_pais:
+            # Vários filhos da mesma seção contam uma vez só: o corte em k vem depois
+            candidatos = self._expandir(candidatos)
+        return candidatos[:self.k]
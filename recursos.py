@@ -0,0 +1,158 @@
+"""Recursos do processo, criados uma única vez e compartilhados pelas sessões.
+
+Os módulos pesados (LangChain, FAISS, pypdf, clientes dos modelos) só são
+importados aqui, na primeira vez que cada recurso é pedido, e não a cada
+execução do script do Streamlit. O aquecimento cria todos os recursos em
+uma thread assim que o servidor atende a primeira sessão; o estado
+(pendente, carregando, pronto ou erro) é exibido na tela e perguntas
+feitas antes do fim do aquecimento esperam por ele.
+"""
+import os
+import threading
+from collections import namedtuple
+from functools import wraps
+
+from metricas import etapa
+
+Base = namedtuple("Base", "versao vectors bm25")
+
+
+def _por_processo(funcao):
+    """Guarda o resultado por argumentos; threads concorrentes criam o recurso uma vez só."""
+    resultados = {}
+    lock = threading.Lock()
+
+    @wraps(funcao)
+    def envoltorio(*args):
+        if args not in resultados:
+            with lock:
+                if args not in resultados:
+                    resultados[args] = funcao(*args)
+        return resultados[args]
+
+    return envoltorio
+
+
+@_por_processo
+def embeddings(google_api_key):
+    from backends_embedding import criar_embeddings
+    from base_conhecimento import CAMINHO_CACHE_EMBEDDINGS
+
+    # Backend definido por BACKEND_EMBEDDING: "google" (API) ou "local" (offline)
+    return criar_embeddings(google_api_key=google_api_key, caminho_cache=CAMINHO_CACHE_EMBEDDINGS)
+
+
+@_por_processo
+def cache_respostas(google_api_key):
+    from cache_respostas import CacheRespostas
+    from recuperacao import MODO_BUSCA
+
+    # No modo lexical nenhuma chamada à API de embeddings é feita
+    return CacheRespostas(embeddings(google_api_key) if MODO_BUSCA != "lexical" else None)
+
+
+@_por_processo
+def llms(groq_api_key):
+    """(llm das respostas, llm auxiliar da reescrita e do resumo)."""
+    from gateway_llm import criar_llm
+
+    # Reescrita de perguntas e resumo da conversa: respostas curtas e estáveis
+    return criar_llm(groq_api_key, streaming=True), criar_llm(groq_api_key, temperature=0, max_tokens=300)
+
+
+@_por_processo
+def cadeia(groq_api_key, intencao):
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from prompts import prompt_da_intencao
+
+    return create_stuff_documents_chain(llms(groq_api_key)[0], prompt_da_intencao(intencao))
+
+
+_base_atual = None
+_lock_base = threading.Lock()
+
+
+def base(google_api_key):
+    """Índice e BM25 da versão atual dos PDFs.
+
+    A versão do manifesto é conferida a cada chamada; os PDFs só são lidos
+    de novo quando a data ou o tamanho mudam. Se algum PDF mudar, o índice
+    é reconstruído e recarregado, e a versão anterior é liberada.
+    """
+    global _base_atual
+    from base_conhecimento import calcular_manifesto, obter_indice, versao_manifesto
+
+    versao = versao_manifesto(calcular_manifesto())
+    if _base_atual is None or _base_atual.versao != versao:
+        with _lock_base:
+            if _base_atual is None or _base_atual.versao != versao:
+                vectors, bm25, _ = obter_indice(embeddings(google_api_key))
+                _base_atual = Base(versao, vectors, bm25)
+    return _base_atual
+
+
+# === Aquecimento ===
+class Aquecimento:
+    def __init__(self):
+        self.estado = "pendente"  # pendente | carregando | pronto | erro
+        self.passo = None
+        self.erro = None
+        self.avisos = []
+        self._thread = None
+        self._concluido = threading.Event()
+        self._lock = threading.Lock()
+
+    def iniciar(self, groq_api_key, google_api_key):
+        """Dispara o aquecimento uma vez por processo; depois de um erro, só reiniciar() tenta de novo."""
+        self._disparar(groq_api_key, google_api_key, "pendente")
+
+    def reiniciar(self, groq_api_key, google_api_key):
+        """Tenta de novo um aquecimento que terminou em erro."""
+        self._disparar(groq_api_key, google_api_key, "erro")
+
+    def _disparar(self, groq_api_key, google_api_key, estado_esperado):
+        with self._lock:
+            if self.estado != estado_esperado:
+                return
+            self.estado, self.erro = "carregando", None
+            self._concluido.clear()
+            self._thread = threading.Thread(
+                target=self._aquecer, args=(groq_api_key, google_api_key), daemon=True, name="aquecimento"
+            )
+            self._thread.start()
+
+    def _aquecer(self, groq_api_key, google_api_key):
+        self.passo = "módulos"
+        from base_conhecimento import PDF_PATHS
+        from rascunho_ficha import FICHAS, campos_da_ficha
+        from roteador import ROTAS
+
+        self.avisos = [f"Arquivo não encontrado: {path}" for path in PDF_PATHS if not os.path.exists(path)]
+        passos = [
+            ("modelos de embedding", lambda: embeddings(google_api_key)),
+            ("índice", lambda: base(google_api_key)),
+            ("cache de respostas", lambda: cache_respostas(google_api_key)),
+            # As fichas não usam cadeia: são geradas por rascunho_ficha
+            ("modelos de linguagem", lambda: [
+                cadeia(groq_api_key, intencao) for intencao in [*ROTAS, "geral"] if intencao not in FICHAS
+            ]),
+            ("campos das fichas", lambda: [campos_da_ficha(intencao) for intencao in FICHAS]),
+        ]
+        try:
+            with etapa("aquecimento"):
+                for descricao, passo in passos:
+                    self.passo = descricao
+                    passo()
+            self.estado = "pronto"
+        except Exception as e:
+            self.erro, self.estado = e, "erro"
+        finally:
+            self._concluido.set()
+
+    def aguardar(self, timeout=None):
+        """Espera o fim do aquecimento; retorna True se os recursos estiverem prontos."""
+        self._concluido.wait(timeout)
+        return self.estado == "pronto"
+
+
+AQUECIMENTO = Aquecimento()
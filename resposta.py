@@ -0,0 +1,96 @@
+"""Geração da resposta em streaming, com medição de latência real.
+
+Os tempos são medidos em relógio de parede (time.perf_counter), que é o
+que o usuário de fato espera: reescrita da pergunta (em conversas),
+consulta ao cache de respostas, busca dos trechos, montagem do contexto,
+tempo até o primeiro token e duração total da geração. O primeiro token
+e o total contam todas as etapas desde o envio da pergunta.
+"""
+import time
+
+from contexto import estimar_tokens, montar_contexto
+from metricas import etapa, registrar
+
+
+# Etapas entre o envio da pergunta e o início da geração
+ETAPAS_ANTES_DA_GERACAO = ("reescrita", "cache", "busca", "contexto")
+
+
+def novos_tempos():
+    return {
+        "reescrita": 0.0, "cache": 0.0, "busca": 0.0, "contexto": 0.0,
+        "primeiro_token": None, "geracao": 0.0, "total": 0.0,
+    }
+
+
+def espera_antes_da_geracao(tempos):
+    return sum(tempos[nome] for nome in ETAPAS_ANTES_DA_GERACAO)
+
+
+def concluir(tempos):
+    tempos["total"] = espera_antes_da_geracao(tempos) + tempos["geracao"]
+
+
+def reescrever(conversa, pergunta, llm, tempos):
+    if not conversa.precisa_reescrever(pergunta):
+        return pergunta
+    inicio = time.perf_counter()
+    with etapa("reescrita"):
+        consulta = conversa.reescrever(pergunta, llm)
+    tempos["reescrita"] = time.perf_counter() - inicio
+    return consulta
+
+
+def buscar_em_cache(cache_respostas, pergunta, versao, tempos, vetor_consulta=None):
+    # Numa falta, inclui a espera pelo embedding da pergunta
+    inicio = time.perf_counter()
+    entrada = cache_respostas.buscar(pergunta, versao, vetor_consulta)
+    tempos["cache"] = time.perf_counter() - inicio
+    return entrada
+
+
+def recuperar(retriever, pergunta, tempos):
+    inicio = time.perf_counter()
+    with etapa("busca", modo=getattr(retriever, "modo", None)) as medicao:
+        contexto = retriever.invoke(pergunta)
+        medicao["itens"] = len(contexto)
+    tempos["busca"] = time.perf_counter() - inicio
+    return contexto
+
+
+def selecionar_contexto(candidatos, tempos):
+    inicio = time.perf_counter()
+    contexto = montar_contexto(candidatos)
+    tempos["contexto"] = time.perf_counter() - inicio
+    return contexto
+
+
+def gerar_em_stream(document_chain, pergunta, contexto, tempos):
+    """Repassa os tokens do LLM à medida que chegam, registrando os tempos."""
+    inicio = time.perf_counter()
+    # O tempo até o primeiro token inclui a fila e o processamento do prompt na Groq
+    tokens_entrada = estimar_tokens(pergunta) + sum(estimar_tokens(doc.page_content) for doc in contexto)
+    with etapa("geracao", tokens_entrada=tokens_entrada) as medicao:
+        partes = []
+        for parte in document_chain.stream({"input": pergunta, "context": contexto}):
+            if tempos["primeiro_token"] is None:
+                tempos["primeiro_token"] = time.perf_counter() - inicio
+                registrar("primeiro_token", tempos["primeiro_token"])
+            partes.append(parte)
+            yield parte
+        medicao["tokens"] = estimar_tokens("".join(partes))
+    tempos["geracao"] = time.perf_counter() - inicio
+    concluir(tempos)
+
+
+def formatar_tempos(tempos):
+    primeiro_token = tempos["primeiro_token"] or 0.0
+    reescrita = f"Reescrita: {tempos['reescrita']:.2f} s · " if tempos["reescrita"] else ""
+    cache = f"Cache: {tempos['cache']:.2f} s · " if tempos["cache"] else ""
+    # A montagem do contexto aparece somada à busca
+    return (
+        f"⏱️ {reescrita}{cache}Busca: {tempos['busca'] + tempos['contexto']:.2f} s · "
+        f"Primeiro token: {espera_antes_da_geracao(tempos) + primeiro_token:.2f} s · "
+        f"Geração: {tempos['geracao']:.2f} s · "
+        f"Total: {tempos['total']:.2f} s"
+    )
@@ -0,0 +1,81 @@
+"""Roteador de intenções executado antes da busca.
+
+Um classificador local por palavras-chave identifica o assunto da pergunta.
+Cada assunto tem um prompt curto (ver prompts.py) e um subconjunto de PDFs
+onde a busca é feita. Perguntas sem assunto claro caem em "geral", que
+usa o prompt completo e a base inteira.
+"""
+import re
+
+from recuperacao import sem_acentos
+
+MANUAL = "Manual_de_Uso_Documenta_Wiki_MDS_SAGICAD.pdf"
+TUTORIAL = "Roteiro_Tutorial_Documenta_Wiki.pdf"
+VIDEO = "Roteiro_video_divulgacao.pdf"
+FICHA_INDICADOR = "Ficha de Indicador.pdf"
+FICHA_PROGRAMA = "Ficha de Programa.pdf"
+PROTOCOLO = "Protocolo_nomeacao_indicadores.pdf"
+
+# intenção: (fontes da busca, [(padrão, peso)])
+# Em caso de empate, vale a ordem deste dicionário.
+ROTAS = {
+    "ficha_indicador": (
+        [FICHA_INDICADOR, PROTOCOLO],
+        [(r"\b(propor|proponha|gere|gerar|monte|montar|elabore|elaborar|sugira|crie)\b.*\bficha\b.*\bindicador", 4),
+         (r"\bficha\b.*\bindicador\b.*\bpreenchida", 4)],
+    ),
+    "ficha_programa": (
+        [FICHA_PROGRAMA, MANUAL],
+        [(r"\b(propor|proponha|gere|gerar|monte|montar|elabore|elaborar|sugira|crie)\b.*\bficha\b.*\bprograma", 4),
+         (r"\bficha\b.*\bprograma\b.*\bpreenchida", 4)],
+    ),
+    "acesso": (
+        [MANUAL, TUTORIAL, VIDEO],
+        [(r"\b(solicitar|pedir|obter|ter) acesso\b", 3), (r"\bacess(o|ar)\b", 1), (r"\bperfil\b", 2),
+         (r"\b(login|logar|senha|ldap)\b", 2), (r"\bpermiss", 2), (r"\beditor\b", 1)],
+    ),
+    "nomeacao": (
+        [PROTOCOLO],
+        [(r"\bnome(ar|acao)?\b.*\bindicador", 3), (r"\bprotocolo\b", 2), (r"\bnomenclatura\b", 3),
+         (r"\bunidade estatistica\b", 3), (r"\btemporalidade\b", 2), (r"\brepresentacao\b", 1)],
+    ),
+    "campos": (
+        [FICHA_INDICADOR, FICHA_PROGRAMA],
+        [(r"\bcampos?\b", 1), (r"\bpreench(er|imento|o)\b", 1),
+         (r"\b(unidade de medida|dominio|periodicidade|publicizacao|fontes? de dados|metodologia|"
+          r"formula de calculo|autoria do metodo|desagregacao|informacoes complementares|"
+          r"descricao e interpretacao|sintaxe|data a partir da qual)\b", 3)],
+    ),
+    "publicacao": (
+        [MANUAL, TUTORIAL],
+        [(r"\bpublic(ar|ada|acao|o)\b", 3)],
+    ),
+    "criacao": (
+        [MANUAL, TUTORIAL, VIDEO],
+        [(r"\b(criar|criacao|criada|nova ficha)\b", 3), (r"\b(excluir|exclusao)\b", 3), (r"\bsei\b", 2)],
+    ),
+    "edicao": (
+        [MANUAL, TUTORIAL],
+        [(r"\b(editar|edicao|edito|alterar)\b", 2), (r"\bpage actions\b", 3), (r"\b(destacad|realcad)", 2)],
+    ),
+}
+
+_PADROES = {
+    intencao: [(re.compile(padrao), peso) for padrao, peso in padroes]
+    for intencao, (_, padroes) in ROTAS.items()
+}
+
+
+def classificar(pergunta):
+    texto = sem_acentos(pergunta.lower())
+    pontuacoes = {
+        intencao: sum(peso for padrao, peso in padroes if padrao.search(texto))
+        for intencao, padroes in _PADROES.items()
+    }
+    melhor = max(pontuacoes, key=pontuacoes.get)
+    return melhor if pontuacoes[melhor] > 0 else "geral"
+
+
+def fontes_da_intencao(intencao):
+    """PDFs onde buscar; None significa a base inteira."""
+    return ROTAS[intencao][0] if intencao in ROTAS else None
@@ -0,0 +1,70 @@
+import hashlib
+import os
+import shutil
+
+import numpy as np
+
+import base_conhecimento
+from backends_embedding import EmbeddingsLocais
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_hash_so_e_recalculado_quando_o_arquivo_muda(tmp_path, monkeypatch):
+    caminho = tmp_path / "a.pdf"
+    caminho.write_bytes(b"primeira")
+    esperado = hashlib.sha256(b"primeira").hexdigest()
+    assert base_conhecimento.hash_arquivo(str(caminho)) == esperado
+
+    leituras = []
+    original = hashlib.sha256
+    monkeypatch.setattr(base_conhecimento.hashlib, "sha256", lambda *a: leituras.append(1) or original(*a))
+    assert base_conhecimento.hash_arquivo(str(caminho)) == esperado
+    assert not leituras
+
+    caminho.write_bytes(b"segunda versao")
+    os.utime(caminho, ns=(1, 1))
+    assert base_conhecimento.hash_arquivo(str(caminho)) == original(b"segunda versao").hexdigest()
+    assert leituras
+
+
+def _copiar_pdfs(destino, nomes):
+    caminhos = []
+    for nome in nomes:
+        caminho = destino / nome
+        shutil.copyfile(os.path.join(RAIZ, nome), caminho)
+        caminhos.append(str(caminho))
+    return caminhos
+
+
+def _conteudo(diretorio, embeddings):
+    vectors, bm25 = base_conhecimento.carregar_base(embeddings, diretorio)
+    documentos = sorted((_id, doc.page_content) for _id, doc in vectors.docstore.itens())
+    vetorizados = sorted(vectors.index_to_docstore_id.values())
+    consulta = np.asarray(embeddings.embed_query("como publicar a ficha de indicador"), dtype="float32")[None]
+    _, rotulos = vectors.index.search(consulta, 5)
+    vizinhos = [vectors.index_to_docstore_id[int(r)] for r in rotulos[0]]
+    lexicais = [(doc.page_content, round(p, 4)) for doc, p in bm25.buscar("unidade de medida da ficha", k=5)]
+    return documentos, vetorizados, vizinhos, lexicais
+
+
+def test_atualizacao_incremental_igual_a_reconstrucao(tmp_path):
+    embeddings = EmbeddingsLocais(dimensao=64)
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    alterado, removido, mantido, novo = _copiar_pdfs(pdfs, [
+        "Roteiro_Tutorial_Documenta_Wiki.pdf", "Roteiro_video_divulgacao.pdf",
+        "Ficha de Indicador.pdf", "Protocolo_nomeacao_indicadores.pdf",
+    ])
+    incremental, completo = str(tmp_path / "incremental"), str(tmp_path / "completo")
+    base_conhecimento.construir_indice(embeddings, [alterado, removido, mantido], incremental)
+
+    # Um PDF muda de conteúdo, um sai e um entra
+    with open(alterado, "ab") as f:
+        f.write(b"\n%revisao\n")
+    atuais = [alterado, mantido, novo]
+    manifesto = base_conhecimento.atualizar_indice(embeddings, atuais, incremental)
+    base_conhecimento.construir_indice(embeddings, atuais, completo)
+
+    assert set(manifesto["fontes"]) == set(atuais)
+    assert _conteudo(incremental, embeddings) == _conteudo(completo, embeddings)
@@ -0,0 +1,47 @@
+from cache_respostas import CacheRespostas, normalizar_pergunta
+from recuperacao import VetorConsulta
+
+
+class EmbeddingsContados:
+    def __init__(self):
+        self.chamadas = 0
+
+    def embed_query(self, texto):
+        self.chamadas += 1
+        return [1.0, 0.0] if "ficha" in texto.lower() else [0.0, 1.0]
+
+
+def test_normalizar_pergunta():
+    assert normalizar_pergunta("  Como EDITAR a Ficha?! ") == "como editar a ficha"
+
+
+def test_acerto_exato_nao_pede_embedding():
+    embeddings = EmbeddingsContados()
+    cache = CacheRespostas(embeddings)
+    cache.gravar("Como editar a ficha?", "v1", "resposta", [])
+    chamadas = embeddings.chamadas
+
+    vetor_consulta = VetorConsulta(embeddings, "como editar a FICHA")
+    entrada = cache.buscar("como editar a FICHA", "v1", vetor_consulta)
+
+    assert entrada["resposta"] == "resposta"
+    assert embeddings.chamadas == chamadas
+
+
+def test_falta_usa_um_embedding_compartilhado():
+    embeddings = EmbeddingsContados()
+    cache = CacheRespostas(embeddings, limiar=0.9)
+    cache.gravar("Como editar a ficha?", "v1", "resposta", [])
+    chamadas = embeddings.chamadas
+
+    vetor_consulta = VetorConsulta(embeddings, "Onde altero uma ficha?")
+    assert cache.buscar("Onde altero uma ficha?", "v1", vetor_consulta)["resposta"] == "resposta"
+    # A busca lê o mesmo vetor sem chamar a API de novo
+    vetor_consulta.obter()
+    assert embeddings.chamadas == chamadas + 1
+
+
+def test_versao_nova_invalida_o_cache():
+    cache = CacheRespostas(None)
+    cache.gravar("Como editar a ficha?", "v1", "resposta", [])
+    assert cache.buscar("Como editar a ficha?", "v2") is None
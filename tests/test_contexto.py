@@ -0,0 +1,51 @@
+from langchain_core.documents import Document
+
+from contexto import estimar_tokens, montar_contexto, ordenar_mmr, unir_sobrepostos
+
+
+def _doc(texto, fonte="a.pdf", pagina=0):
+    return Document(page_content=texto, metadata={"source": fonte, "page": pagina})
+
+
+def test_une_trechos_sobrepostos_da_mesma_pagina():
+    primeiro = _doc("O campo unidade de medida indica como o valor é expresso")
+    segundo = _doc("como o valor é expresso no painel da ficha de indicador")
+    unidos = unir_sobrepostos([primeiro, segundo])
+    assert [doc.page_content for doc in unidos] == [
+        "O campo unidade de medida indica como o valor é expresso no painel da ficha de indicador"
+    ]
+
+
+def test_une_trecho_contido_e_mantem_a_posicao_do_primeiro():
+    outro = _doc("Outro assunto qualquer", pagina=1)
+    longo = _doc("A ficha é publicada pelo ponto focal depois da revisão")
+    contido = _doc("publicada pelo ponto focal")
+    assert unir_sobrepostos([outro, longo, contido]) == [outro, longo]
+
+
+def test_nao_une_paginas_ou_fontes_diferentes():
+    a = _doc("como o valor é expresso no painel", pagina=0)
+    b = _doc("como o valor é expresso no painel", pagina=1)
+    c = _doc("como o valor é expresso no painel", fonte="b.pdf")
+    assert unir_sobrepostos([a, b, c]) == [a, b, c]
+
+
+def test_mmr_afasta_trechos_repetidos():
+    docs = [
+        _doc("publicar ficha de indicador na wiki", pagina=0),
+        _doc("publicar ficha de indicador na wiki hoje", pagina=1),
+        _doc("protocolo de nomeação com representação no fim", pagina=2),
+    ]
+    assert ordenar_mmr(docs, lambda_mmr=0.5) == [docs[0], docs[2], docs[1]]
+    # Só relevância: a ordem do retriever é mantida
+    assert ordenar_mmr(docs, lambda_mmr=1.0) == docs
+
+
+def test_montar_contexto_respeita_o_orcamento():
+    docs = [_doc("a" * 300, pagina=i) for i in range(3)] + [_doc("curto", pagina=3)]
+    orcamento = 2 * estimar_tokens("a" * 300) + estimar_tokens("curto")
+    selecionados = montar_contexto(docs, orcamento_tokens=orcamento)
+    # O terceiro trecho longo não cabe, mas o curto depois dele ainda entra
+    assert sorted(doc.metadata["page"] for doc in selecionados) in ([0, 1, 3], [0, 2, 3], [1, 2, 3])
+    assert sum(estimar_tokens(doc.page_content) for doc in selecionados) <= orcamento
+    assert montar_contexto([]) == []
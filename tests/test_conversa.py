@@ -0,0 +1,30 @@
+import pytest
+
+from conversa import parece_continuacao
+
+
+@pytest.mark.parametrize("pergunta", [
+    "e para ficha de programa?",
+    "E o campo unidade de medida?",
+    "Então como faço isso?",
+    "Também vale para a ficha de programa?",
+    "Como assim?",
+    "Pode dar um exemplo?",
+    "Onde fica esse botão?",
+])
+def test_continuacoes(pergunta):
+    assert parece_continuacao(pergunta)
+
+
+@pytest.mark.parametrize("pergunta", [
+    "É possível publicar uma ficha de indicador sem o DMA?",
+    "É obrigatório preencher a sintaxe?",
+    "E-mail do DMA?",
+    "Posso editar a mesma ficha duas vezes?",
+    "Qual o prazo?",
+    "Existe um manual?",
+    "Como publicar?",
+    "Como editar?",
+])
+def test_perguntas_novas(pergunta):
+    assert not parece_continuacao(pergunta)
@@ -0,0 +1,119 @@
+import threading
+import time
+from typing import Any, List, Optional
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import gateway_llm
+from gateway_llm import BaldeTokens, GatewayLLM
+
+
+class ModeloFalso(BaseChatModel):
+    model_name: str
+    resposta: str = "ok"
+    falhas: int = 0
+    chamadas: int = 0
+    liberar: Optional[Any] = None
+
+    @property
+    def _llm_type(self):
+        return "falso"
+
+    def _generate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        self.chamadas += 1
+        if self.liberar is not None:
+            self.liberar.wait(5)
+        if self.chamadas <= self.falhas:
+            raise TimeoutError("tempo esgotado")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.resposta))])
+
+
+@pytest.fixture(autouse=True)
+def sem_backoff(monkeypatch):
+    monkeypatch.setattr(gateway_llm.random, "uniform", lambda a, b: 0.0)
+
+
+def test_balde_reserva_e_espera():
+    balde = BaldeTokens(60)  # 1 unidade por segundo
+    assert balde.reservar(30) == 0.0
+    assert balde.reservar(60) == pytest.approx(30, abs=0.1)
+
+
+def test_balde_acerta_reserva_com_consumo_real():
+    balde = BaldeTokens(600)
+    balde.reservar(500)
+    balde.acertar(500, 120)
+    assert balde.disponivel == pytest.approx(480, abs=1)
+
+
+def test_balde_devolve_sem_passar_da_capacidade():
+    balde = BaldeTokens(100)
+    balde.reservar(10)
+    balde.devolver(50)
+    assert balde.disponivel == 100
+
+
+def test_balde_pausado_pelo_provedor():
+    balde = BaldeTokens(60)
+    balde.pausar(5)
+    assert balde.reservar(1) == pytest.approx(5, abs=0.1)
+
+
+def test_falha_devolve_a_reserva(monkeypatch):
+    nome = "modelo-teste-falha"
+    monkeypatch.setenv("LLM_REQUISICOES_POR_MINUTO_MODELO_TESTE_FALHA", "10")
+    monkeypatch.setenv("LLM_TOKENS_POR_MINUTO_MODELO_TESTE_FALHA", "6000")
+    modelo = ModeloFalso(model_name=nome, falhas=2, resposta="x" * 30)
+    gateway = GatewayLLM(principal=modelo, tentativas=3)
+
+    mensagens = [HumanMessage(content="pergunta " * 10)]
+    assert gateway.invoke(mensagens).content == "x" * 30
+    assert modelo.chamadas == 3
+
+    estado = gateway_llm._estado(modelo)
+    # Só a tentativa que respondeu fica nos buckets, pelo consumo real
+    usado = gateway._tokens_entrada(mensagens) + gateway_llm.estimar_tokens("x" * 30)
+    assert estado.requisicoes.disponivel == pytest.approx(9, abs=0.1)
+    assert estado.tokens.disponivel == pytest.approx(6000 - usado, abs=5)
+
+
+def test_reserva_do_modelo_que_falhou_e_devolvida():
+    principal = ModeloFalso(model_name="modelo-teste-principal", falhas=10)
+    reserva = ModeloFalso(model_name="modelo-teste-reserva", resposta="da reserva")
+    gateway = GatewayLLM(principal=principal, reserva=reserva, tentativas=2)
+
+    assert gateway.invoke([HumanMessage(content="oi")]).content == "da reserva"
+    estado = gateway_llm._estado(principal)
+    assert estado.requisicoes.disponivel == pytest.approx(estado.requisicoes.capacidade, abs=0.1)
+    assert estado.tokens.disponivel == pytest.approx(estado.tokens.capacidade, abs=1)
+
+
+def test_chamadas_identicas_em_andamento_sao_juntadas():
+    liberar = threading.Event()
+    modelo = ModeloFalso(model_name="modelo-teste-voo", resposta="resposta única", liberar=liberar)
+    gateway = GatewayLLM(principal=modelo)
+    mensagens = [HumanMessage(content="mesma pergunta")]
+    respostas = []
+
+    def perguntar():
+        respostas.append(gateway.invoke(mensagens).content)
+
+    primeira = threading.Thread(target=perguntar)
+    primeira.start()
+    while modelo.chamadas == 0:
+        time.sleep(0.01)
+    segunda = threading.Thread(target=perguntar)
+    segunda.start()
+    # Tempo para a segunda chamada entrar no voo da primeira
+    time.sleep(0.1)
+    liberar.set()
+    primeira.join(5)
+    segunda.join(5)
+
+    assert respostas == ["resposta única", "resposta única"]
+    assert modelo.chamadas == 1
+    assert not gateway_llm._voos
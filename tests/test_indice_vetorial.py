@@ -0,0 +1,78 @@
+import faiss
+import numpy as np
+import pytest
+
+from indice_vetorial import buscar_filtrado, descricao_indice, descricao_para, seletor_rotulos
+
+
+def _ivf_em_grupos(grupos=4, por_grupo=100, dimensao=8):
+    rng = np.random.default_rng(0)
+    centros = rng.normal(scale=100, size=(grupos, dimensao)).astype("float32")
+    vetores = np.concatenate([centro + rng.normal(size=(por_grupo, dimensao)) for centro in centros])
+    vetores = vetores.astype("float32")
+    index = faiss.index_factory(dimensao, f"IVF{grupos},Flat")
+    index.train(vetores)
+    index.add_with_ids(vetores, np.arange(len(vetores), dtype="int64"))
+    return index, centros
+
+
+def test_filtro_seletivo_no_ivf_aumenta_o_nprobe():
+    index, centros = _ivf_em_grupos()
+    faiss.extract_index_ivf(index).nprobe = 1
+    # A consulta cai no primeiro grupo, e o filtro só aceita trechos do último
+    consulta = centros[:1]
+    rotulos = np.arange(300, 310)
+    seletor = seletor_rotulos(rotulos)
+
+    _, sem_retentativa = index.search(consulta, 5, params=faiss.SearchParametersIVF(sel=seletor, nprobe=1))
+    assert (sem_retentativa[0] != -1).sum() < 5
+
+    _, indices = buscar_filtrado(index, consulta, 5, seletor, len(rotulos))
+    assert len(indices[0]) == 5
+    assert set(indices[0]) <= set(rotulos)
+    # O nprobe do índice não muda
+    assert faiss.extract_index_ivf(index).nprobe == 1
+
+
+def test_filtro_com_menos_rotulos_que_k():
+    index, centros = _ivf_em_grupos()
+    faiss.extract_index_ivf(index).nprobe = 1
+    _, indices = buscar_filtrado(index, centros[:1], 5, seletor_rotulos([350, 399]), 2)
+    assert sorted(i for i in indices[0] if i != -1) == [350, 399]
+
+
+def test_filtro_no_indice_plano():
+    index = faiss.index_factory(4, "IDMap2,Flat")
+    index.add_with_ids(np.eye(4, dtype="float32"), np.array([10, 11, 12, 13], dtype="int64"))
+    _, indices = buscar_filtrado(index, np.eye(4, dtype="float32")[:1], 2, seletor_rotulos([12, 13]), 2)
+    assert set(indices[0]) == {12, 13}
+
+
+@pytest.mark.parametrize("tipo, total, esperado", [
+    ("flat", 10, "IDMap2,Flat"),
+    ("flat16", 10**6, "IDMap2,SQfp16"),
+    # Poucos vetores para treinar: cai no plano equivalente
+    ("ivf", 77, "IDMap2,Flat"),
+    ("ivf16", 77, "IDMap2,SQfp16"),
+    ("ivf", 78, "IVF2,Flat"),
+    ("ivf16", 10_000, "IVF256,SQfp16"),
+    ("ivf", 50_000, "IVF894,Flat"),
+    # PQ só com vetores para treinar os 256 centróides de cada subespaço
+    ("ivfpq", 9_983, "IVF255,SQfp16"),
+    ("ivfpq", 9_984, "IVF256,PQ96x8np"),
+])
+def test_descricao_indice(tipo, total, esperado):
+    assert descricao_indice(tipo, 768, total) == esperado
+
+
+def test_descricao_indice_pq_exige_dimensao_multipla_de_8():
+    assert descricao_indice("ivfpq", 769, 50_000) == "IVF894,SQfp16"
+
+
+def test_descricao_para_limita_a_amostra_de_treino():
+    assert descricao_para(768, 10**7, "ivf", amostra=50_000) == descricao_indice("ivf", 768, 50_000)
+
+
+def test_tipo_desconhecido():
+    with pytest.raises(ValueError):
+        descricao_indice("hnsw", 768, 1000)
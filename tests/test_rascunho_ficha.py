@@ -0,0 +1,59 @@
+from rascunho_ficha import FICHAS, aplicar_protocolo, campos_da_ficha, grupos_da_ficha, orientacoes_do_modelo
+
+
+def test_campos_da_ficha_de_programa_vem_da_transcricao_do_modelo():
+    campos = campos_da_ficha("ficha_programa")
+    assert campos[:2] == ("Descrição e Objetivo Geral", "Público-Alvo")
+    assert campos[-1] == "Plano Plurianual"
+    # Títulos que só agrupam campos não são campos
+    assert "Informações de Governança do Programa" not in campos
+    assert "Informações Complementares" not in campos
+    assert "Nome do Programa" not in campos
+
+
+def test_orientacoes_do_modelo():
+    orientacoes = orientacoes_do_modelo(FICHAS["ficha_programa"].modelo)
+    assert orientacoes["Data de Início/Criação"].startswith("Formato: março/2023")
+    assert "Nome do Programa" in orientacoes
+
+
+def test_grupos_da_ficha_de_programa_comecam_pelo_nome():
+    grupos = grupos_da_ficha("ficha_programa", campos_por_grupo=3)
+    assert grupos[0].campos[0] == "Nome do Programa"
+    assert sum(len(grupo.campos) for grupo in grupos) == len(campos_da_ficha("ficha_programa")) + 1
+
+
+def test_sem_modelo_a_ficha_nao_tem_campos(monkeypatch, tmp_path):
+    ficha = FICHAS["ficha_programa"]._replace(modelo=str(tmp_path / "ausente.md"))
+    monkeypatch.setitem(FICHAS, "ficha_programa", ficha)
+    campos_da_ficha.cache_clear()
+    try:
+        assert campos_da_ficha("ficha_programa") == ()
+    finally:
+        campos_da_ficha.cache_clear()
+
+
+def test_protocolo_mantem_nome_no_formato():
+    nome, avisos = aplicar_protocolo("Famílias beneficiárias do Programa Bolsa Família, no ano, número")
+    assert nome == "IN### - Famílias beneficiárias do Programa Bolsa Família, no ano, número"
+    assert avisos == ["O nome deve ser validado em conjunto com o DMA."]
+
+
+def test_protocolo_limpa_prefixos_e_reordena_a_temporalidade():
+    nome, _ = aplicar_protocolo('**Nome do Indicador: IN 12 - "Cisternas entregues, anual, Número."**\nExplicação')
+    assert nome == "IN### - Cisternas entregues, anual, número"
+    nome, _ = aplicar_protocolo("Cisternas entregues, anual, no semiárido, percentual")
+    assert nome == "IN### - Cisternas entregues, no semiárido, anual, percentual"
+
+
+def test_protocolo_retira_mensal_e_avisa():
+    nome, avisos = aplicar_protocolo("Famílias atendidas, mensal, número")
+    assert nome == "IN### - Famílias atendidas, número"
+    assert any("mensal" in aviso for aviso in avisos)
+
+
+def test_protocolo_avisa_falta_de_representacao_e_nome_longo():
+    _, avisos = aplicar_protocolo("Famílias atendidas pelo programa")
+    assert any("representação" in aviso for aviso in avisos)
+    _, avisos = aplicar_protocolo(" ".join(["palavra"] * 16) + ", número")
+    assert any("17 palavras" in aviso for aviso in avisos)
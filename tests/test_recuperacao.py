@@ -0,0 +1,101 @@
+import math
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+from recuperacao import ConstrutorBM25, IndiceBM25, fundir_rrf, tokenizar
+
+TRECHOS = {
+    "a.pdf": ["ficha de indicador publicada na wiki", "unidade de medida do indicador"],
+    "b.pdf": ["ficha de programa e público alvo", "programa publicado com público alvo definido"],
+    "c.pdf": ["protocolo de nomeação do indicador"],
+}
+
+
+def _vectors(trechos):
+    documentos, mapa = {}, {}
+    for rotulo, (fonte, texto) in enumerate(trechos):
+        documentos[f"id{rotulo}"] = Document(page_content=texto, metadata={"source": fonte})
+        mapa[rotulo] = f"id{rotulo}"
+    return SimpleNamespace(docstore=SimpleNamespace(search=documentos.get), index_to_docstore_id=mapa)
+
+
+def _trechos(corpus):
+    return [(fonte, texto) for fonte, textos in corpus.items() for texto in textos]
+
+
+def _construir(diretorio, corpus, anterior=None, mantidas=(), rotulo_inicial=0):
+    construtor = ConstrutorBM25(str(diretorio), anterior)
+    for fonte in mantidas:
+        construtor.manter(fonte)
+    for rotulo, (fonte, texto) in enumerate(_trechos(corpus), start=rotulo_inicial):
+        construtor.adicionar(fonte, rotulo, texto)
+    construtor.fechar()
+
+
+def test_pontuacao_bm25(tmp_path):
+    _construir(tmp_path, TRECHOS)
+    bm25 = IndiceBM25.carregar(str(tmp_path), _vectors(_trechos(TRECHOS)))
+
+    docs = [tokenizar(texto) for _, texto in _trechos(TRECHOS)]
+    media = sum(map(len, docs)) / len(docs)
+
+    def esperado(consulta, doc):
+        total = 0.0
+        for termo in set(tokenizar(consulta)):
+            df = sum(termo in d for d in docs)
+            tf = doc.count(termo)
+            if tf:
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                total += idf * tf * 2.5 / (tf + 1.5 * (0.25 + 0.75 * len(doc) / media))
+        return total
+
+    consulta = "público alvo do programa"
+    esperados = sorted(
+        ((esperado(consulta, tokenizar(texto)), texto) for _, texto in _trechos(TRECHOS)), reverse=True
+    )
+    esperados = [(texto, pontuacao) for pontuacao, texto in esperados if pontuacao > 0]
+    resultado = bm25.buscar(consulta, k=5)
+    assert [doc.page_content for doc, _ in resultado] == [texto for texto, _ in esperados]
+    assert [pontuacao for _, pontuacao in resultado] == pytest.approx([pontuacao for _, pontuacao in esperados])
+    assert bm25.buscar("termo inexistente") == []
+
+
+def test_busca_restrita_as_fontes(tmp_path):
+    _construir(tmp_path, TRECHOS)
+    bm25 = IndiceBM25.carregar(str(tmp_path), _vectors(_trechos(TRECHOS)))
+    fontes = {doc.metadata["source"] for doc, _ in bm25.buscar("indicador", k=10, fontes=["c.pdf"])}
+    assert fontes == {"c.pdf"}
+    assert sorted(bm25.rotulos_das_fontes(["a.pdf", "c.pdf"])) == [0, 1, 4]
+    seletor, total = bm25.seletor_das_fontes(["c.pdf", "a.pdf"])
+    assert total == 3 and bm25.seletor_das_fontes(["a.pdf", "c.pdf"])[0] is seletor
+
+
+def test_segmentos_mantidos_equivalem_a_reconstrucao(tmp_path):
+    anterior, incremental, completo = tmp_path / "v1", tmp_path / "v2", tmp_path / "completo"
+    _construir(anterior, TRECHOS)
+    # b.pdf muda, c.pdf sai, d.pdf entra; a.pdf é mantido da versão anterior
+    novos = {"b.pdf": ["programa sem público alvo"], "d.pdf": ["indicador de programa"]}
+    _construir(incremental, novos, anterior=str(anterior), mantidas=["a.pdf"], rotulo_inicial=2)
+    _construir(completo, {"a.pdf": TRECHOS["a.pdf"], **novos})
+
+    trechos = _trechos({"a.pdf": TRECHOS["a.pdf"], **novos})
+    a = IndiceBM25.carregar(str(incremental), _vectors(trechos))
+    b = IndiceBM25.carregar(str(completo), _vectors(trechos))
+    assert list(a.termos) == list(b.termos) and list(a.df) == list(b.df)
+    for consulta in ("indicador", "programa público alvo", "unidade de medida"):
+        assert [(d.page_content, pytest.approx(p)) for d, p in a.buscar(consulta, k=10)] == \
+            [(d.page_content, p) for d, p in b.buscar(consulta, k=10)]
+
+
+def _doc(texto, fonte="a.pdf", pagina=0):
+    return Document(page_content=texto, metadata={"source": fonte, "page": pagina})
+
+
+def test_fundir_rrf():
+    a, b, c = _doc("a"), _doc("b"), _doc("c")
+    # "b" aparece nas duas listas e sobe para o topo; cópias iguais contam como um só
+    assert [d.page_content for d in fundir_rrf([[a, b], [_doc("b"), c]], k=3)] == ["b", "a", "c"]
+    assert len(fundir_rrf([[a, b], [c]], k=2)) == 2
+    assert fundir_rrf([[], []]) == []